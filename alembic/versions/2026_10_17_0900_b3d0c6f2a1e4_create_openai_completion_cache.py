@@ -0,0 +1,39 @@
+"""create openai_completion_cache
+
+Revision ID: b3d0c6f2a1e4
+Revises: 5713291372c4
+Create Date: 2026-10-17 09:00:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy
+from sqlalchemy import (
+    Column,
+    DateTime,
+    String,
+    Text,
+)
+
+
+# revision identifiers, used by Alembic.
+revision = "b3d0c6f2a1e4"
+down_revision = "5713291372c4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    table_name = "openai_completion_cache"
+    op.create_table(
+        table_name,
+        # sha256 hex digest of the canonical request
+        Column("key", String(64), primary_key=True),
+        Column("response", Text, nullable=False),
+        Column("expire_at", DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("idx_openai_completion_cache_expire_at", table_name, ["expire_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_openai_completion_cache_expire_at", table_name="openai_completion_cache")
+    op.drop_table("openai_completion_cache")
@@ -0,0 +1,39 @@
+"""create thread_summaries
+
+Revision ID: c7e4a9d1f2b8
+Revises: b3d0c6f2a1e4
+Create Date: 2026-10-17 09:30:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy
+from sqlalchemy import (
+    Column,
+    DateTime,
+    String,
+    Text,
+)
+
+
+# revision identifiers, used by Alembic.
+revision = "c7e4a9d1f2b8"
+down_revision = "b3d0c6f2a1e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "thread_summaries",
+        Column("team_id", String(32), primary_key=True),
+        Column("channel_id", String(32), primary_key=True),
+        Column("thread_ts", String(32), primary_key=True),
+        Column("summary", Text, nullable=False),
+        # ts of the newest message folded into the summary
+        Column("watermark_ts", String(32), nullable=False),
+        Column("updated_at", DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("thread_summaries")
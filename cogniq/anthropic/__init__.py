@@ -0,0 +1 @@
+from .cogniq_anthropic import CogniqAnthropic, messages_to_prompt
@@ -0,0 +1,108 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import json
+
+from cogniq.config import ANTHROPIC_API_BASE, ANTHROPIC_API_KEY, ANTHROPIC_CHAT_MODEL, ANTHROPIC_MAX_TOKENS_RESPONSE
+from cogniq.openai import CogniqOpenAI
+from cogniq.openai.errors import InferenceHTTPError
+from cogniq.transport import SSEEvent
+
+HUMAN_PROMPT = "\n\nHuman:"
+AI_PROMPT = "\n\nAssistant:"
+
+
+def messages_to_prompt(messages: Sequence[Dict[str, str]]) -> str:
+    """
+    Converts chat messages to an Anthropic prompt of alternating Human and Assistant turns, ending with an open Assistant turn.
+    System messages become Human turns.
+    """
+    turns = []
+    for message in messages:
+        prefix = AI_PROMPT if message["role"] == "assistant" else HUMAN_PROMPT
+        turns.append(f"{prefix} {message['content']}")
+    if not turns or not turns[0].startswith(HUMAN_PROMPT):
+        turns.insert(0, HUMAN_PROMPT)
+    return "".join(turns) + AI_PROMPT
+
+
+class CogniqAnthropic(CogniqOpenAI):
+    """
+    Anthropic Claude, through the text completions API.
+
+    Takes and returns chat completions in the OpenAI shape, so that personalities can use either backend,
+    and shares the connection pool, retries, circuit breakers, rate limiting and caching of CogniqOpenAI.
+    """
+
+    CHAT_COMPLETIONS_URL = f"{ANTHROPIC_API_BASE}/v1/complete"
+    COMPLETIONS_URL = f"{ANTHROPIC_API_BASE}/v1/complete"
+    API_KEY = ANTHROPIC_API_KEY
+    API_VERSION = "2023-06-01"
+
+    # Parameters of /v1/complete that callers may set. OpenAI-only ones, e.g. frequency_penalty, are dropped.
+    PAYLOAD_PARAMETERS = {"model", "temperature", "top_p", "top_k", "stop_sequences", "metadata"}
+
+    def _chat_payload(self, *, messages: Sequence[Dict[str, str]], stream: bool, **kwargs) -> Dict[str, Any]:
+        max_tokens = kwargs.pop("max_tokens", ANTHROPIC_MAX_TOKENS_RESPONSE)
+        default_payload = {
+            "model": ANTHROPIC_CHAT_MODEL,
+            "prompt": messages_to_prompt(messages),
+            "stream": stream,
+            "max_tokens_to_sample": max_tokens,
+        }
+        dropped = set(kwargs) - self.PAYLOAD_PARAMETERS
+        if dropped:
+            logger.debug(f"Dropping parameters Anthropic does not accept: {sorted(dropped)}")
+        # add and override the accepted kwargs to payload
+        return {**default_payload, **{key: value for key, value in kwargs.items() if key in self.PAYLOAD_PARAMETERS}}
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "x-api-key": self.API_KEY,
+            "anthropic-version": self.API_VERSION,
+        }
+
+    def _estimate_tokens(self, payload: Dict[str, Any]) -> int:
+        return super()._estimate_tokens({**payload, "max_tokens": payload.get("max_tokens_to_sample")})
+
+    def _update_rate_limit(self, *, payload: Dict[str, Any], headers: Mapping[str, str]) -> None:
+        # Anthropic reports its limits as anthropic-ratelimit-{requests,tokens}-{limit,remaining}
+        translated = {}
+        for name in ("requests", "tokens"):
+            for field in ("limit", "remaining"):
+                value = headers.get(f"anthropic-ratelimit-{name}-{field}")
+                if value is not None:
+                    translated[f"x-ratelimit-{field}-{name}"] = value
+        super()._update_rate_limit(payload=payload, headers=translated)
+
+    def _completion_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": result.get("id") or result.get("log_id"),
+            "model": result.get("model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": result.get("completion", "")},
+                    "finish_reason": result.get("stop_reason"),
+                }
+            ],
+        }
+
+    def _stream_delta(self, event: SSEEvent) -> str | None:
+        """
+        Extracts the text from a `completion` event. `ping` events are skipped, and `error` events raise,
+        so that overloaded streams are retried.
+        """
+        if event.event == "completion":
+            return json.loads(event.data).get("completion")
+        if event.event == "error":
+            error = json.loads(event.data).get("error", {})
+            status = 529 if error.get("type") == "overloaded_error" else 500
+            raise InferenceHTTPError(status=status, body=event.data)
+        return None
@@ -1,4 +1,5 @@
 import os
+import json
 import logging
 from dotenv import load_dotenv
 
@@ -30,12 +31,20 @@ PORT = env("PORT", "3000")
 APP_ENV = env("APP_ENV", "production")
 BING_SEARCH_ENDPOINT = env("BING_SEARCH_ENDPOINT", "https://api.bing.microsoft.com")
 
+# API base URLs; point these at `python -m cogniq.standins` for offline runs and load tests
+OPENAI_API_BASE = env("OPENAI_API_BASE", "https://api.openai.com/v1")
+PERPLEXITY_API_BASE = env("PERPLEXITY_API_BASE", "https://api.perplexity.ai")
+ANTHROPIC_API_BASE = env("ANTHROPIC_API_BASE", "https://api.anthropic.com")
+SLACK_API_URL = env("SLACK_API_URL", "https://slack.com/api/")
+
 OPENAI_CHAT_MODEL = env("OPENAI_CHAT_MODEL", "gpt-3.5-turbo")
 OPENAI_MAX_TOKENS_HISTORY = env("OPENAI_MAX_TOKENS_HISTORY", 800)
 OPENAI_MAX_TOKENS_RETRIEVAL = env("OPENAI_MAX_TOKENS_RETRIEVAL", 700)
 OPENAI_MAX_TOKENS_PROMPT = env("OPENAI_MAX_TOKENS_PROMPT", 1000)
 OPENAI_MAX_TOKENS_RESPONSE = env("OPENAI_MAX_TOKENS_RESPONSE", 800)
 OPENAI_TOTAL_MAX_TOKENS = env("OPENAI_TOTAL_MAX_TOKENS", 4097)
+OPENAI_THREAD_SUMMARY_MAX_TOKENS = int(env("OPENAI_THREAD_SUMMARY_MAX_TOKENS", 200))  # rolling summary of a thread's older messages
+OPENAI_THREAD_FOLD_MESSAGES = int(env("OPENAI_THREAD_FOLD_MESSAGES", 100))  # messages fetched, and folded, at a time from a long thread
 
 POSTGRES_HOST = env("POSTGRES_HOST", "localhost")
 POSTGRES_USER = env("POSTGRES_USER", "cogniq")
@@ -47,3 +56,87 @@ LOG_LEVEL = logging.DEBUG if APP_ENV == "development" else logging.INFO
 MUTED_LOG_LEVEL = logging.WARN if APP_ENV == "development" else logging.WARN
 
 TASK_MANAGER_MAX_SLEEP_TIME = env("TASK_MANAGER_MAX_SLEEP_TIME", 30)  # 30 seconds
+
+# Slack history fetching
+SLACK_HISTORY_PAGE_SIZE = int(env("SLACK_HISTORY_PAGE_SIZE", 20))  # messages per conversations.history page
+SLACK_REPLIES_PAGE_SIZE = int(env("SLACK_REPLIES_PAGE_SIZE", 20))  # messages per conversations.replies page
+SLACK_REPLIES_CONCURRENCY = int(env("SLACK_REPLIES_CONCURRENCY", 4))  # threads fetched at once; conversations.replies is Tier 3
+SLACK_MESSAGE_CACHE_MAX_THREADS = int(env("SLACK_MESSAGE_CACHE_MAX_THREADS", 2048))  # threads and channels held in memory
+SLACK_MESSAGE_CACHE_MAX_MESSAGES = int(env("SLACK_MESSAGE_CACHE_MAX_MESSAGES", 500))  # newest messages held per thread or channel
+SLACK_MESSAGE_CACHE_TTL = float(env("SLACK_MESSAGE_CACHE_TTL", 900))  # seconds before a cached thread is fetched again
+SLACK_DIRECTORY_TTL = float(env("SLACK_DIRECTORY_TTL", 3600))  # seconds a bot, user or channel name is kept
+SLACK_DIRECTORY_MAX_ENTRIES = int(env("SLACK_DIRECTORY_MAX_ENTRIES", 50000))  # names kept across all workspaces
+
+# Pacing of Slack Web API calls. See cogniq.slack.scheduler.SlackScheduler.
+SLACK_TIER_RATES = json.loads(env("SLACK_TIER_RATES", '{"1": 1, "2": 20, "3": 50, "4": 100}'))  # requests per minute, per method and workspace
+SLACK_METHOD_TIERS = json.loads(env("SLACK_METHOD_TIERS", "{}"))  # tier overrides, e.g. {"chat.update": 3}
+SLACK_CHANNEL_MESSAGES_PER_SECOND = float(env("SLACK_CHANNEL_MESSAGES_PER_SECOND", 1))  # chat.postMessage and chat.update, per channel
+SLACK_RATE_LIMIT_RETRIES = int(env("SLACK_RATE_LIMIT_RETRIES", 3))  # retries of a call Slack rate limited despite the pacing
+
+# Streaming answers into a Slack message. See cogniq.slack.stream_publisher.StreamPublisher.
+SLACK_STREAM_MIN_INTERVAL = float(env("SLACK_STREAM_MIN_INTERVAL", 1))  # seconds between chat.update calls, at least
+SLACK_STREAM_MAX_INTERVAL = float(env("SLACK_STREAM_MAX_INTERVAL", 5))  # seconds between chat.update calls, at most
+SLACK_STREAM_TARGET_CHARS = int(env("SLACK_STREAM_TARGET_CHARS", 120))  # new characters worth an update, at the observed rate
+SLACK_STREAM_MAX_CHARS = int(env("SLACK_STREAM_MAX_CHARS", 39000))  # characters per message; Slack truncates past 40,000
+SLACK_STREAM_TAIL_CHARS = int(env("SLACK_STREAM_TAIL_CHARS", 3000))  # characters shown of each stream when several share a message
+
+# Shared HTTP connection pool for the inference backends
+HTTP_POOL_LIMIT = int(env("HTTP_POOL_LIMIT", 100))  # total simultaneous connections
+HTTP_POOL_LIMIT_PER_HOST = int(env("HTTP_POOL_LIMIT_PER_HOST", 32))  # simultaneous connections per host
+HTTP_POOL_KEEPALIVE_TIMEOUT = float(env("HTTP_POOL_KEEPALIVE_TIMEOUT", 60))  # seconds an idle connection is kept open
+HTTP_POOL_DNS_CACHE_TTL = int(env("HTTP_POOL_DNS_CACHE_TTL", 300))  # seconds
+HTTP_REQUEST_TIMEOUT = float(env("HTTP_REQUEST_TIMEOUT", 600))  # seconds, total per request
+
+# Cache of deterministic (temperature 0 or explicitly opted-in) completions
+OPENAI_COMPLETION_CACHE_MAX_ENTRIES = int(env("OPENAI_COMPLETION_CACHE_MAX_ENTRIES", 1024))
+OPENAI_COMPLETION_CACHE_TTL = float(env("OPENAI_COMPLETION_CACHE_TTL", 3600))  # seconds
+OPENAI_COMPLETION_CACHE_SQL = env("OPENAI_COMPLETION_CACHE_SQL", "false").lower() == "true"  # also persist to the database
+
+# Client-side rate limits, per API key and model. Adjusted at runtime from the x-ratelimit-* response headers.
+OPENAI_RATE_LIMIT_RPM = float(env("OPENAI_RATE_LIMIT_RPM", 3500))  # requests per minute
+OPENAI_RATE_LIMIT_TPM = float(env("OPENAI_RATE_LIMIT_TPM", 90000))  # tokens per minute
+OPENAI_RATE_LIMITS = json.loads(env("OPENAI_RATE_LIMITS", "{}"))  # per model, e.g. {"gpt-4": {"rpm": 500, "tpm": 10000}}
+
+# Attempts for retryable inference errors (timeouts, 429 and 5xx)
+OPENAI_RETRY_ATTEMPTS = int(env("OPENAI_RETRY_ATTEMPTS", 5))
+OPENAI_STREAM_RETRY_ATTEMPTS = int(env("OPENAI_STREAM_RETRY_ATTEMPTS", 2))
+
+# Hedging: send a backup request once a call is slower than the rolling p95 latency of its endpoint and model
+OPENAI_HEDGE_ENABLED = env("OPENAI_HEDGE_ENABLED", "true").lower() == "true"
+OPENAI_HEDGE_PERCENTILE = float(env("OPENAI_HEDGE_PERCENTILE", 95))
+OPENAI_HEDGE_MIN_SAMPLES = int(env("OPENAI_HEDGE_MIN_SAMPLES", 20))  # no hedging until this many samples are recorded
+
+# Circuit breaker per endpoint and model
+OPENAI_CIRCUIT_FAILURE_THRESHOLD = int(env("OPENAI_CIRCUIT_FAILURE_THRESHOLD", 5))  # consecutive failures
+OPENAI_CIRCUIT_RESET_TIMEOUT = float(env("OPENAI_CIRCUIT_RESET_TIMEOUT", 30))  # seconds before a trial call
+OPENAI_FALLBACK_MODELS = json.loads(env("OPENAI_FALLBACK_MODELS", "{}"))  # used while a circuit is open, e.g. {"gpt-4": "gpt-3.5-turbo"}
+
+OPENAI_TOKEN_COUNT_CACHE_MAX_ENTRIES = int(env("OPENAI_TOKEN_COUNT_CACHE_MAX_ENTRIES", 65536))  # token counts memoized across requests
+OPENAI_TOKENIZER_THREADS = int(env("OPENAI_TOKENIZER_THREADS", 2))  # threads that encode large texts off the event loop
+OPENAI_TOKENIZER_OFFLOAD_CHARS = int(env("OPENAI_TOKENIZER_OFFLOAD_CHARS", 20000))  # texts this large are encoded off the loop
+TIKTOKEN_ENCODINGS_DIR = env("TIKTOKEN_ENCODINGS_DIR", "tiktoken_encodings")  # written by prebake_encodings.py; never downloaded at runtime
+
+# Map-reduce summarization of content too large for one request
+OPENAI_SUMMARIZE_CONCURRENCY = int(env("OPENAI_SUMMARIZE_CONCURRENCY", 4))  # chunks summarized at once
+OPENAI_SUMMARIZE_MAX_DEPTH = int(env("OPENAI_SUMMARIZE_MAX_DEPTH", 3))  # reduce levels before truncating
+
+OPENAI_BATCH_MAX_CONCURRENCY = int(env("OPENAI_BATCH_MAX_CONCURRENCY", 8))  # default for async_chat_completion_batch
+
+# Model routes: ordered candidate models per kind of request. See cogniq.openai.model_router.ModelRouter.
+OPENAI_MODEL_ROUTES = json.loads(
+    env(
+        "OPENAI_MODEL_ROUTES",
+        json.dumps(
+            {
+                "chat": {"candidates": [{"model": "gpt-3.5-turbo", "max_prompt_tokens": 100}, {"model": "gpt-4"}, {"model": "gpt-4-32k"}]},
+                "evaluate": {"candidates": [{"model": "gpt-4"}, {"model": "gpt-4-32k"}]},
+                "function_call": {"candidates": [{"model": "gpt-3.5-turbo-0613"}, {"model": "gpt-3.5-turbo-16k"}]},
+                "task": {"candidates": [{"model": "gpt-4-1106-preview"}]},
+            }
+        ),
+    )
+)
+OPENAI_CONTEXT_WINDOWS = json.loads(env("OPENAI_CONTEXT_WINDOWS", "{}"))  # extra or corrected context windows, e.g. {"gpt-4-0125-preview": 128000}
+
+ANTHROPIC_CHAT_MODEL = env("ANTHROPIC_CHAT_MODEL", "claude-2")
+ANTHROPIC_MAX_TOKENS_RESPONSE = int(env("ANTHROPIC_MAX_TOKENS_RESPONSE", 4000))
@@ -1,2 +1,6 @@
-from .cogniq_openai import CogniqOpenAI
+from .cogniq_openai import CogniqOpenAI, BatchResult
+from .completion_cache import CompletionCache
+from .conversation import Conversation, Message
+from .token_counter import TokenCountCache, shared_token_count_cache
+from .model_router import ModelRouter
 from .chat import system_message, user_message, assistant_message, message_to_string
@@ -0,0 +1,102 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import time
+
+from cogniq.config import OPENAI_CIRCUIT_FAILURE_THRESHOLD, OPENAI_CIRCUIT_RESET_TIMEOUT
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, *, name: str, failure_threshold: int, reset_timeout: float):
+        """
+        Trips open after failure_threshold consecutive failures, so that calls fail fast instead of waiting on a sick endpoint.
+        After reset_timeout seconds one trial call is let through; its outcome closes or re-opens the circuit.
+        A trial that ends without an outcome (cancelled, or a bad request) re-opens it, and a trial still in flight
+        after another reset_timeout is given up on, so that the circuit never stays half-open.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trials = 0  # trial calls let through so far; the last one is the trial in flight
+
+    def allow(self) -> int | None:
+        """
+        Returns None when the call must not go through. Otherwise returns the number of the trial the call is,
+        or 0 for an ordinary call; pass it to end_trial when the call ends.
+        """
+        if self.state == self.CLOSED:
+            return 0
+        now = time.monotonic()
+        if now - self.opened_at >= self.reset_timeout:
+            # Open long enough, or half-open with a trial call that never reported back
+            logger.info("circuit %s half-open, letting a trial call through", self.name)
+            self.state = self.HALF_OPEN
+            self.opened_at = now
+            self.trials += 1
+            return self.trials
+        return None  # open, or half-open with the trial call in flight
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("circuit %s closed", self.name)
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning("circuit %s open after %s failures", self.name, self.failures)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def end_trial(self, trial: int) -> None:
+        """
+        Called when a call ends, whatever its outcome, with what allow() returned for it.
+        If it was the trial in flight and recorded neither success nor failure, the circuit re-opens.
+        Other calls ending while the circuit is half-open leave the trial alone.
+        """
+        if trial and trial == self.trials and self.state == self.HALF_OPEN:
+            logger.info("circuit %s trial call ended without an outcome, re-opening", self.name)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class CircuitBreakers:
+    def __init__(
+        self,
+        *,
+        failure_threshold: int = OPENAI_CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = OPENAI_CIRCUIT_RESET_TIMEOUT,
+    ):
+        """
+        One CircuitBreaker per endpoint and model.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+    def get(self, *, endpoint: str, model: str) -> CircuitBreaker:
+        key = (endpoint, model)
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            breaker = self.breakers[key] = CircuitBreaker(
+                name=f"{endpoint} {model}",
+                failure_threshold=self.failure_threshold,
+                reset_timeout=self.reset_timeout,
+            )
+        return breaker
+
+    def stats(self) -> Dict[str, str]:
+        return {breaker.name: breaker.state for breaker in self.breakers.values()}
@@ -5,48 +5,236 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+import asyncio
+import inspect
 import json
+import time
 
-import aiohttp
-from tenacity import retry, stop_after_attempt, wait_exponential
-
-from cogniq.config import OPENAI_CHAT_MODEL, OPENAI_MAX_TOKENS_RESPONSE, OPENAI_API_KEY
+from cogniq.config import (
+    OPENAI_CHAT_MODEL,
+    OPENAI_MAX_TOKENS_RESPONSE,
+    OPENAI_API_BASE,
+    OPENAI_API_KEY,
+    OPENAI_RETRY_ATTEMPTS,
+    OPENAI_STREAM_RETRY_ATTEMPTS,
+    OPENAI_HEDGE_ENABLED,
+    OPENAI_HEDGE_PERCENTILE,
+    OPENAI_HEDGE_MIN_SAMPLES,
+    OPENAI_FALLBACK_MODELS,
+    OPENAI_BATCH_MAX_CONCURRENCY,
+)
+from cogniq.transport import PooledTransport, SSEEvent, SSEParser, shared_transport
 
+from .circuit_breaker import CircuitBreaker, CircuitBreakers
+from .completion_cache import CompletionCache, completion_cache_key
+from .conversation import Conversation
+from .errors import CircuitOpenError, InferenceHTTPError
+from .latency import LatencyRecorder
+from .model_router import ModelRouter
+from .rate_limiter import RateLimiter
+from .retry_policy import inference_retry, is_retryable, parse_retry_after, retry_wait
+from .singleflight import SingleFlight, StreamFanOut
 from .summarizer import Summarizer
 
 
+class BatchResult(NamedTuple):
+    index: int
+    request: Dict[str, Any]
+    response: Dict[str, Any] | None
+    error: Exception | None
+
+
 class CogniqOpenAI:
-    CHAT_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
-    COMPLETIONS_URL = "https://api.openai.com/v1/completions"
+    CHAT_COMPLETIONS_URL = f"{OPENAI_API_BASE}/chat/completions"
+    COMPLETIONS_URL = f"{OPENAI_API_BASE}/completions"
     API_KEY = OPENAI_API_KEY
 
-    def __init__(self):
+    def __init__(
+        self,
+        *,
+        transport: PooledTransport | None = None,
+        completion_cache: CompletionCache | None = None,
+        rate_limiter: RateLimiter | None = None,
+        model_router: ModelRouter | None = None,
+    ):
         """
         OpenAI model
 
+        transport (PooledTransport): Connection pool to send requests over. Defaults to the process-wide pool.
+        completion_cache (CompletionCache): Cache for deterministic completions. Defaults to an in-memory cache.
+        rate_limiter (RateLimiter): Client-side RPM/TPM limiter. Defaults to the limits in config.
+        model_router (ModelRouter): Picks the model of requests that name a route. Defaults to the routes in config.
+
         """
+        self.transport = transport or shared_transport()
+        self.completion_cache = completion_cache or CompletionCache()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.model_router = model_router or ModelRouter()
+        # identical requests already in flight are awaited rather than sent again
+        self.singleflight = SingleFlight()
+        self.stream_fan_out = StreamFanOut()
+        self.latency = LatencyRecorder()
+        self.circuit_breakers = CircuitBreakers()
+        self.hedged = 0
+
         # initialize summarizer
         self.summarizer = Summarizer(
             async_chat_completion_create=self.async_chat_completion_create,
         )
 
+    async def async_setup(self) -> None:
+        """
+        Opens the connection pool. Please call before serving requests.
+        """
+        await self.transport.async_setup()
+        await self.completion_cache.async_setup()
+
+    async def async_close(self) -> None:
+        """
+        Closes the connection pool. Please call on shutdown.
+        """
+        await self.transport.async_close()
+
     async def async_chat_completion_create(
-        self, *, messages: List[Dict[str, str]], stream_callback: Callable[..., None] | None = None, **kwargs
+        self,
+        *,
+        messages: Sequence[Dict[str, str]],
+        stream_callback: Callable[..., Any] | None = None,
+        cache: bool | None = None,
+        route: str | None = None,
+        latency_budget: float | None = None,
+        **kwargs,
     ) -> Dict[str, Any]:
+        """
+        Creates a chat completion. Any kwargs are added to the request payload.
+
+        cache: Serve and store the response in the completion cache. By default, only temperature 0 requests are cached.
+               Streaming requests are never cached.
+        route: Let the model router pick the model from this route, unless a model is given.
+        latency_budget: Seconds the caller is willing to wait, overriding the route's budget.
+        """
         stream_callback_set = stream_callback is not None
         url = self.CHAT_COMPLETIONS_URL
+        payload = self._chat_payload(messages=messages, stream=stream_callback_set, **kwargs)
+        if route is not None and "model" not in kwargs:
+            await self._awarm_token_counts(payload)
+            payload["model"] = self._route_model(url=url, payload=payload, route=route, latency_budget=latency_budget)
+
+        if stream_callback_set:
+            return await self.async_openai_stream(url=url, payload=payload, stream_callback=stream_callback, **kwargs)  # type: ignore # since mypy is not picking up on the control flow that ensures stream_callback is not None
+
+        key = completion_cache_key(url=url, payload=payload)
+        if not self.completion_cache.is_cacheable(payload=payload, cache=cache):
+            return await self.singleflight.do(key, lambda: self._async_openai_guarded(url=url, payload=payload))
+
+        cached_response = await self.completion_cache.get(key)
+        if cached_response is not None:
+            logger.debug("completion cache hit: %s", key)
+            return cached_response
+        response = await self.singleflight.do(key, lambda: self._async_openai_guarded(url=url, payload=payload))
+        await self.completion_cache.set(key, response)
+        return response
+
+    async def async_chat_completion_batch(
+        self,
+        requests: Iterable[Dict[str, Any]],
+        *,
+        max_concurrency: int = OPENAI_BATCH_MAX_CONCURRENCY,
+        ordered: bool = False,
+    ) -> AsyncIterator[BatchResult]:
+        """
+        Runs many chat completions, at most max_concurrency at a time, and yields a BatchResult for each.
+
+        Each request is the kwargs of one async_chat_completion_create call. Results are yielded as they complete,
+        or in request order when ordered is set. A failed request yields a BatchResult with its error
+        instead of failing the batch.
+
+        ```
+        requests = [{"messages": [user_message(chunk)], "temperature": 0} for chunk in chunks]
+        async for result in cogniq_openai.async_chat_completion_batch(requests, max_concurrency=4):
+            if result.error is None:
+                ...
+        ```
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(index: int, request: Dict[str, Any]) -> BatchResult:
+            async with semaphore:
+                try:
+                    response = await self.async_chat_completion_create(**request)
+                except Exception as e:
+                    logger.warning(f"Batch request {index} failed: {e}")
+                    return BatchResult(index=index, request=request, response=None, error=e)
+                return BatchResult(index=index, request=request, response=response, error=None)
+
+        tasks = [asyncio.ensure_future(run(index, request)) for index, request in enumerate(requests)]
+        try:
+            if not ordered:
+                for next_result in asyncio.as_completed(tasks):
+                    yield await next_result
+            else:
+                for task in tasks:
+                    yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def astream_chat_completion(
+        self, *, messages: Sequence[Dict[str, str]], route: str | None = None, latency_budget: float | None = None, **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Streams a chat completion as an async iterator of content deltas.
+
+        The HTTP response is only read as fast as the caller consumes deltas, which gives backpressure.
+
+        ```
+        async for delta in cogniq_openai.astream_chat_completion(messages=messages, model="gpt-4"):
+            ...
+        ```
+        """
+        url = self.CHAT_COMPLETIONS_URL
+        payload = self._chat_payload(messages=messages, stream=True, **kwargs)
+        if route is not None and "model" not in kwargs:
+            payload["model"] = self._route_model(url=url, payload=payload, route=route, latency_budget=latency_budget)
+        return self._astream_coalesced(url=url, payload=payload)
+
+    def _route_model(self, *, url: str, payload: Dict[str, Any], route: str, latency_budget: float | None) -> str:
+        """
+        Picks the model for the payload from its size and the observed p95 latency of each candidate:
+        time to first token for streams, whole response otherwise.
+        """
+        kind = "first_token" if payload.get("stream") else "completion"
+        max_tokens = int(payload.get("max_tokens") or OPENAI_MAX_TOKENS_RESPONSE)
+        return self.model_router.choose(
+            route=route,
+            prompt_tokens=self._estimate_tokens(payload) - max_tokens,
+            max_tokens=max_tokens,
+            latency_budget=latency_budget,
+            observed_latency=lambda model: self.latency.percentile(kind=kind, endpoint=url, model=model, p=95),
+        )
+
+    def _astream_coalesced(self, *, url: str, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Subscribes to the identical stream already in flight, or starts it.
+        """
+        key = completion_cache_key(url=url, payload=payload)
+        return self.stream_fan_out.subscribe(key, lambda: self._astream_resumable(url=url, payload=payload))
+
+    def _chat_payload(self, *, messages: Sequence[Dict[str, str]], stream: bool, **kwargs) -> Dict[str, Any]:
         default_payload = {
             "model": OPENAI_CHAT_MODEL,
-            "messages": messages,
-            "stream": stream_callback_set,
+            "messages": messages.to_payload() if isinstance(messages, Conversation) else list(messages),
+            "stream": stream,
             "max_tokens": OPENAI_MAX_TOKENS_RESPONSE,
         }
-        payload = {**default_payload, **kwargs}  # add and override any additional kwargs to payload
+        return {**default_payload, **kwargs}  # add and override any additional kwargs to payload
 
-        if stream_callback_set:
-            return await self.async_openai_stream(url=url, payload=payload, stream_callback=stream_callback, **kwargs)  # type: ignore # since mypy is not picking up on the control flow that ensures stream_callback is not None
-        else:
-            return await self.async_openai(url=url, payload=payload, **kwargs)
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.API_KEY}",
+        }
 
     async def async_completion_create(self, *, prompt: str, **kwargs) -> Dict[str, Any]:
         url = self.COMPLETIONS_URL
@@ -54,52 +242,221 @@ class CogniqOpenAI:
 
         return await self.async_openai(url=url, payload=payload, **kwargs)
 
-    @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=2, max=60))
-    async def async_openai(self, *, url: str, payload: Dict[str, Any], **kwargs) -> Dict[str, Any]:
-        headers = {
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.API_KEY}",
-        }
+    async def _acquire_rate_limit(self, *, payload: Dict[str, Any]) -> None:
+        await self._awarm_token_counts(payload)
+        await self.rate_limiter.acquire(api_key=self.API_KEY, model=payload.get("model", ""), tokens=self._estimate_tokens(payload))
+
+    def _update_rate_limit(self, *, payload: Dict[str, Any], headers: Mapping[str, str]) -> None:
+        self.rate_limiter.update_from_headers(api_key=self.API_KEY, model=payload.get("model", ""), headers=headers)
+
+    async def _awarm_token_counts(self, payload: Dict[str, Any]) -> None:
+        """
+        Counts the payload's texts off the event loop when they are large, ahead of _estimate_tokens.
+        """
+        texts = [message["content"] for message in payload.get("messages") or [] if message.get("content")]
+        if payload.get("prompt"):
+            texts.append(str(payload["prompt"]))
+        await self.summarizer.awarm(texts)
+
+    def _estimate_tokens(self, payload: Dict[str, Any]) -> int:
+        """
+        Estimates the tokens a request counts against the TPM limit: the prompt plus the most it may generate.
+        """
+        prompt_tokens = 0
+        if payload.get("messages"):
+            prompt_tokens += self.summarizer.count_tokens(list(payload["messages"]))
+        if payload.get("prompt"):
+            prompt_tokens += self.summarizer.count_tokens(str(payload["prompt"]))
+        if payload.get("functions"):
+            prompt_tokens += self.summarizer.count_functions(payload["functions"])
+        return prompt_tokens + int(payload.get("max_tokens") or OPENAI_MAX_TOKENS_RESPONSE)
+
+    def _circuit_breaker(self, *, url: str, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], CircuitBreaker, int]:
+        """
+        Returns the payload to send, its circuit breaker, and the trial number to end the call with (see CircuitBreaker.allow).
+        While the circuit for the requested model is open, switches to the configured fallback model, or fails fast.
+        """
+        model = payload.get("model", "")
+        tried = [model]
+        while True:
+            breaker = self.circuit_breakers.get(endpoint=url, model=model)
+            trial = breaker.allow()
+            if trial is not None:
+                return ({**payload, "model": model} if model != payload.get("model") else payload), breaker, trial
+            fallback = OPENAI_FALLBACK_MODELS.get(model)
+            if fallback is None or fallback in tried:
+                raise CircuitOpenError(endpoint=url, model=tried[0])
+            logger.warning(f"Circuit open for {model}, falling back to {fallback}")
+            model = fallback
+            tried.append(model)
+
+    async def _async_openai_guarded(self, *, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        payload, breaker, trial = self._circuit_breaker(url=url, payload=payload)
+        try:
+            response = await self._async_openai_hedged(url=url, payload=payload)
+        except Exception as e:
+            if is_retryable(e):  # a bad request says nothing about the health of the endpoint
+                breaker.record_failure()
+            raise
+        else:
+            breaker.record_success()
+            return response
+        finally:
+            breaker.end_trial(trial)
+
+    async def _async_openai_hedged(self, *, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Sends a backup request once the first is slower than the rolling p95 for its endpoint and model,
+        and returns whichever answers first.
+        """
+        hedge_after = None
+        if OPENAI_HEDGE_ENABLED:
+            hedge_after = self.latency.percentile(
+                kind="completion",
+                endpoint=url,
+                model=payload.get("model", ""),
+                p=OPENAI_HEDGE_PERCENTILE,
+                min_samples=OPENAI_HEDGE_MIN_SAMPLES,
+            )
+        primary = asyncio.ensure_future(self.async_openai(url=url, payload=payload))
+        if hedge_after is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        logger.info(f"Hedging {payload.get('model')} request after {hedge_after:.2f}s")
+        self.hedged += 1
+        pending = {primary, asyncio.ensure_future(self.async_openai(url=url, payload=payload))}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                if not pending:
+                    return done.pop().result()  # both failed, raise the last error
+        finally:
+            for task in pending:
+                task.cancel()
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    raise Exception(f"Error {response.status}: {await response.text()}")
+    @inference_retry(OPENAI_RETRY_ATTEMPTS)
+    async def async_openai(self, *, url: str, payload: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        await self._acquire_rate_limit(payload=payload)
+        started = time.monotonic()
+        async with await self.transport.post(url, json=payload, headers=self._headers()) as response:
+            self._update_rate_limit(payload=payload, headers=response.headers)
+            if response.status == 200:
+                result = self._completion_response(await response.json())
+                self.latency.observe(kind="completion", endpoint=url, model=payload.get("model", ""), seconds=time.monotonic() - started)
+                return result
+            else:
+                raise await self._http_error(response)
 
-    @retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=2, max=60))
     async def async_openai_stream(
-        self, *, url: str, payload: Dict[str, Any], stream_callback: Callable[..., None], **kwargs
+        self, *, url: str, payload: Dict[str, Any], stream_callback: Callable[..., Any], **kwargs
     ) -> Dict[str, Any]:
-        headers = {
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.API_KEY}",
-        }
+        """
+        Streams the completion into stream_callback, which may be a plain function or a coroutine function,
+        and returns the whole completion once the stream ends.
+        """
+        deltas: List[str] = []
+        async for delta in self._astream_coalesced(url=url, payload=payload):
+            deltas.append(delta)
+            result = stream_callback(delta)
+            if inspect.isawaitable(result):
+                await result
+        return {"choices": [{"message": {"content": "".join(deltas)}}]}
+
+    async def _http_error(self, response) -> InferenceHTTPError:
+        return InferenceHTTPError(
+            status=response.status,
+            body=await response.text(),
+            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+        )
+
+    async def _astream_resumable(self, *, url: str, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Streams with retries. When a retried stream starts over, the characters already delivered are skipped,
+        so that callers never see the same tokens twice. That only holds for a deterministic payload (temperature 0
+        or a seed): a sampled completion is a different text every time, so once any of it was delivered,
+        a failure is raised rather than splicing two answers together.
+        """
+        resumable = payload.get("temperature") == 0 or payload.get("seed") is not None
+        delivered = 0  # characters yielded to the caller so far
+        attempt = 0
+        while True:
+            attempt += 1
+            produced = 0  # characters produced by this attempt
+            attempt_payload, breaker, trial = self._circuit_breaker(url=url, payload=payload)
+            try:
+                async for delta in self.astream_openai(url=url, payload=attempt_payload):
+                    start = produced
+                    produced += len(delta)
+                    if produced > delivered:
+                        resumed = delta[max(0, delivered - start) :]
+                        delivered = produced
+                        yield resumed
+                breaker.record_success()
+                return
+            except (asyncio.CancelledError, GeneratorExit):
+                # Cancelled, or the consumer stopped reading before the stream ended
+                breaker.end_trial(trial)
+                raise
+            except Exception as e:
+                if is_retryable(e):
+                    breaker.record_failure()
+                breaker.end_trial(trial)
+                if attempt >= OPENAI_STREAM_RETRY_ATTEMPTS or not is_retryable(e) or (delivered and not resumable):
+                    raise
+                wait = retry_wait(e, attempt)
+                logger.warning(f"Stream failed after {delivered} characters, resuming in {wait:.1f}s: {e}")
+                await asyncio.sleep(wait)
+
+    async def astream_openai(self, *, url: str, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        await self._acquire_rate_limit(payload=payload)
+        started = time.monotonic()
+        first_token = True
+        async with await self.transport.post(url, json=payload, headers=self._headers()) as response:
+            self._update_rate_limit(payload=payload, headers=response.headers)
+            if response.status != 200:
+                raise await self._http_error(response)
+
+            # Tokens will be sent as data-only server-sent events as they become available,
+            # with the stream terminated by a data: [DONE] message.
+            parser = SSEParser()
+            async for chunk in response.content.iter_any():
+                for event in parser.feed(chunk):
+                    if event.data == "[DONE]":
+                        return
+                    delta = self._stream_delta(event)
+                    if delta:
+                        if first_token:
+                            first_token = False
+                            self.latency.observe(
+                                kind="first_token", endpoint=url, model=payload.get("model", ""), seconds=time.monotonic() - started
+                            )
+                        yield delta
+            for event in parser.flush():
+                if event.data != "[DONE]":
+                    delta = self._stream_delta(event)
+                    if delta:
+                        yield delta
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status == 200:
-                    # Tokens will be sent as data-only server-sent events as they become available,
-                    # with the stream terminated by a data: [DONE] message.
-                    final_content = {"choices": [{"message": {"content": ""}}]}
-                    while True:
-                        line = await response.content.readline()
-                        line = line.strip()
-                        if line == b"data: [DONE]":
-                            return final_content
-                        elif line.startswith(b"data: "):
-                            line = line[len(b"data: ") :]
-                            obj = json.loads(line.decode("utf-8"))
-                            try:
-                                delta = obj.get("choices", [{}])[0].get("delta", {})
-                                content = delta.get("content")
-                                if content:
-                                    final_content["choices"][0]["message"]["content"] += content
-                                    stream_callback(content)
-                            except (KeyError, IndexError):
-                                logger.error("Unexpected data structure: %s", obj)
-                else:
-                    raise Exception(f"Error {response.status}: {await response.text()}")
+    def _completion_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Normalizes a non-streaming response to the chat completion shape. OpenAI compatible APIs need nothing.
+        """
+        return result
+
+    def _stream_delta(self, event: SSEEvent) -> str | None:
+        """
+        Extracts the content delta from one server-sent event of a chat completion stream.
+        """
+        obj = json.loads(event.data)
+        try:
+            return obj.get("choices", [{}])[0].get("delta", {}).get("content")
+        except (KeyError, IndexError):
+            logger.error("Unexpected data structure: %s", obj)
+            return None
@@ -0,0 +1,157 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy
+from sqlalchemy import Column, DateTime, MetaData, String, Table, Text, and_
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from cogniq.config import (
+    OPENAI_COMPLETION_CACHE_MAX_ENTRIES,
+    OPENAI_COMPLETION_CACHE_TTL,
+    OPENAI_COMPLETION_CACHE_SQL,
+)
+
+
+def completion_cache_key(*, url: str, payload: Dict[str, Any]) -> str:
+    """
+    Canonical hash of a completion request: the endpoint, messages, model and sampling params.
+    """
+    request = {key: value for key, value in payload.items() if key != "stream"}
+    canonical = json.dumps({"url": url, "payload": request}, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    def __init__(
+        self,
+        *,
+        max_entries: int = OPENAI_COMPLETION_CACHE_MAX_ENTRIES,
+        ttl: float = OPENAI_COMPLETION_CACHE_TTL,
+        engine: AsyncEngine | None = None,
+        sql: bool = OPENAI_COMPLETION_CACHE_SQL,
+    ):
+        """
+        Cache of non-streaming completion responses.
+
+        Entries live in an in-memory LRU bounded by max_entries and ttl (seconds).
+        When an engine is given and sql is enabled, entries are also written through to the
+        `openai_completion_cache` table, so that they survive restarts and are shared across workers.
+
+        Only deterministic requests are cached; see is_cacheable.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.engine = engine if sql else None
+        self.entries: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.metadata = MetaData()
+        self.table = Table(
+            "openai_completion_cache",
+            self.metadata,
+            Column("key", String(64), primary_key=True),
+            Column("response", Text),
+            Column("expire_at", DateTime(timezone=True)),
+        )
+
+    async def async_setup(self) -> None:
+        if self.engine is None:
+            return
+        async with self.engine.begin() as conn:
+
+            def get_tables(sync_conn):
+                inspector = sqlalchemy.inspect(sync_conn)
+                return inspector.get_table_names()
+
+            table_names = await conn.run_sync(get_tables)
+            for table in ["openai_completion_cache"]:
+                if table not in table_names:
+                    raise Exception(f"Table {table} not found in database. Please run migrations with `.venv/bin/alembic upgrade head`.")
+
+    def is_cacheable(self, *, payload: Dict[str, Any], cache: bool | None = None) -> bool:
+        """
+        A request is cached when the caller opts in explicitly, or when it is deterministic (temperature 0).
+        """
+        if cache is not None:
+            return cache
+        return payload.get("temperature") == 0
+
+    async def get(self, key: str) -> Dict[str, Any] | None:
+        entry = self.entries.get(key)
+        if entry is not None:
+            expire_at, response = entry
+            if expire_at > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(response)
+            del self.entries[key]
+
+        response = await self._sql_get(key)
+        if response is not None:
+            self._remember(key, response)
+            self.hits += 1
+            return copy.deepcopy(response)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, response: Dict[str, Any]) -> None:
+        response = copy.deepcopy(response)
+        self._remember(key, response)
+        await self._sql_set(key, response)
+
+    def _remember(self, key: str, response: Dict[str, Any]) -> None:
+        self.entries[key] = (time.monotonic() + self.ttl, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def _sql_get(self, key: str) -> Dict[str, Any] | None:
+        if self.engine is None:
+            return None
+        c = self.table.c
+        try:
+            async with self.engine.begin() as conn:
+                result = await conn.execute(
+                    self.table.select().where(and_(c.key == key, c.expire_at > datetime.now(timezone.utc))).limit(1)
+                )
+                row = result.one_or_none()
+        except Exception as e:
+            logger.warning(f"Completion cache lookup failed, treating as a miss: {e}")
+            return None
+        if row is None:
+            return None
+        return json.loads(row["response"])
+
+    async def _sql_set(self, key: str, response: Dict[str, Any]) -> None:
+        if self.engine is None:
+            return
+        expire_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        try:
+            async with self.engine.begin() as conn:
+                await conn.execute(self.table.delete().where(self.table.c.key == key))
+                await conn.execute(self.table.insert().values(key=key, response=json.dumps(response), expire_at=expire_at))
+        except Exception as e:
+            logger.warning(f"Completion cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+            "sql": self.engine is not None,
+        }
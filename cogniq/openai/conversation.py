@@ -0,0 +1,159 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+
+class Message:
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+
+    @classmethod
+    def from_dict(cls, message: Dict[str, str] | Message) -> Message:
+        if isinstance(message, Message):
+            return message
+        return cls(message["role"], message["content"])
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+    def __repr__(self) -> str:
+        return f"Message({self.role!r}, {self.content!r})"
+
+
+class _Storage:
+    __slots__ = ("messages", "prefix_sums")
+
+    def __init__(self, messages: Tuple[Message, ...]):
+        self.messages = messages
+        # encoding name -> running token totals; prefix_sums[key][i] is the token count of messages[:i]
+        self.prefix_sums: Dict[str, List[int]] = {}
+
+
+class Conversation(Sequence[Dict[str, str]]):
+    """
+    An immutable sequence of chat messages.
+
+    Slicing returns a view over the same storage in O(1), so one history can be handed to many consumers,
+    each trimming or extending it without affecting the others. Extending (`conversation + [message]`) copies
+    the message references into new storage; the messages themselves are shared.
+
+    Per-message token counts are computed once per storage and kept as prefix sums,
+    so the token count of any view is O(1) and trimming to a token budget is O(log n).
+
+    Indexing and iterating yield fresh message dicts; to_payload returns the list to send to the API.
+    """
+
+    __slots__ = ("_storage", "_start", "_stop")
+
+    def __init__(self, messages: Iterable[Dict[str, str] | Message] = ()):
+        if isinstance(messages, Conversation):
+            self._storage, self._start, self._stop = messages._storage, messages._start, messages._stop
+            return
+        self._storage = _Storage(tuple(Message.from_dict(message) for message in messages))
+        self._start = 0
+        self._stop = len(self._storage.messages)
+
+    @classmethod
+    def _view(cls, storage: _Storage, start: int, stop: int) -> Conversation:
+        conversation = cls.__new__(cls)
+        conversation._storage, conversation._start, conversation._stop = storage, start, stop
+        return conversation
+
+    def messages(self) -> Iterator[Message]:
+        return islice(self._storage.messages, self._start, self._stop)
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    @overload
+    def __getitem__(self, index: int) -> Dict[str, str]:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Conversation:
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return Conversation([self[i] for i in range(start, stop, step)])
+            return self._view(self._storage, self._start + start, self._start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Conversation index out of range")
+        return self._storage.messages[self._start + index].to_dict()
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        for message in self.messages():
+            yield message.to_dict()
+
+    def __add__(self, other: Iterable[Dict[str, str] | Message]) -> Conversation:
+        extension = tuple(Conversation(other).messages())
+        storage = _Storage((*self.messages(), *extension))
+        if self._start == 0:
+            # the new storage starts with this view, so the running totals computed so far still hold
+            for key, prefix in self._storage.prefix_sums.items():
+                storage.prefix_sums[key] = prefix[: self._stop + 1]
+        return self._view(storage, 0, len(storage.messages))
+
+    def __radd__(self, other: Iterable[Dict[str, str] | Message]) -> Conversation:
+        return Conversation(other) + self
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"Conversation({list(self.messages())!r})"
+
+    def to_payload(self) -> List[Dict[str, str]]:
+        """
+        The messages as the chat completions API expects them. Call when sending.
+        """
+        return [message.to_dict() for message in self.messages()]
+
+    def _prefix_sums(self, key: str, count: Callable[[str], int]) -> List[int]:
+        prefix = self._storage.prefix_sums.setdefault(key, [0])
+        messages = self._storage.messages
+        # Extended lazily, and only as far as this view reaches
+        for i in range(len(prefix) - 1, self._stop):
+            prefix.append(prefix[-1] + count(messages[i].content))
+        return prefix
+
+    def count_tokens(self, *, key: str, count: Callable[[str], int]) -> int:
+        """
+        Total tokens in the message contents.
+
+        key: Name of the encoding that count uses, e.g. `encoding.name`.
+        count: Counts the tokens in one string.
+        """
+        prefix = self._prefix_sums(key, count)
+        return prefix[self._stop] - prefix[self._start]
+
+    def ceil_start(self, max_tokens: int, *, key: str, count: Callable[[str], int]) -> Conversation:
+        """
+        The longest suffix within max_tokens: drops messages from the beginning.
+        """
+        prefix = self._prefix_sums(key, count)
+        start = bisect_left(prefix, prefix[self._stop] - max_tokens, self._start, self._stop)
+        return self._view(self._storage, start, self._stop)
+
+    def ceil_end(self, max_tokens: int, *, key: str, count: Callable[[str], int]) -> Conversation:
+        """
+        The longest prefix within max_tokens: drops messages from the end.
+        """
+        prefix = self._prefix_sums(key, count)
+        stop = bisect_right(prefix, prefix[self._start] + max_tokens, self._start, self._stop + 1) - 1
+        return self._view(self._storage, self._start, stop)
@@ -0,0 +1,70 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import base64
+import json
+import mmap
+import os
+import tiktoken
+import tiktoken.model
+
+from cogniq.config import TIKTOKEN_ENCODINGS_DIR
+
+_shared_encodings: Dict[str, tiktoken.Encoding] = {}
+
+
+def encoding_name_for_model(model: str) -> str:
+    """
+    The encoding name for a model, from tiktoken's tables. Unlike tiktoken.encoding_for_model, nothing is loaded.
+    """
+    if model in tiktoken.model.MODEL_TO_ENCODING:
+        return tiktoken.model.MODEL_TO_ENCODING[model]
+    for prefix, name in tiktoken.model.MODEL_PREFIX_TO_ENCODING.items():
+        if model.startswith(prefix):
+            return name
+    raise KeyError(f"Could not automatically map {model} to a tokeniser.")
+
+
+def load_encoding(name: str, directory: str = TIKTOKEN_ENCODINGS_DIR) -> tiktoken.Encoding:
+    """
+    Builds an encoding from the files written by prebake_encodings.py, without network access:
+    {name}.tiktoken holds the mergeable ranks, one "<base64 token> <rank>" per line, and is parsed through a memory map;
+    {name}.json holds the split pattern and special tokens.
+    """
+    ranks_path = os.path.join(directory, f"{name}.tiktoken")
+    spec_path = os.path.join(directory, f"{name}.json")
+    if not (os.path.isfile(ranks_path) and os.path.isfile(spec_path)):
+        raise EnvironmentError(
+            f"The {name} encoding is missing from {os.path.abspath(directory)}. "
+            f"Please run `python prebake_encodings.py {name}`, or set TIKTOKEN_ENCODINGS_DIR."
+        )
+
+    with open(spec_path) as f:
+        spec = json.load(f)
+    with open(ranks_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as ranks_map:
+        mergeable_ranks = {}
+        for line in iter(ranks_map.readline, b""):
+            token, rank = line.split()
+            mergeable_ranks[base64.b64decode(token)] = int(rank)
+
+    logger.info("Loaded the %s encoding (%s ranks) from %s", name, len(mergeable_ranks), ranks_path)
+    return tiktoken.Encoding(
+        name=name,
+        pat_str=spec["pat_str"],
+        mergeable_ranks=mergeable_ranks,
+        special_tokens=spec["special_tokens"],
+    )
+
+
+def shared_encoding(model: str) -> tiktoken.Encoding:
+    """
+    The process-wide encoding for a model, shared by all Summarizer instances. Loaded on first use.
+    """
+    name = encoding_name_for_model(model)
+    if name not in _shared_encodings:
+        _shared_encodings[name] = load_encoding(name)
+    return _shared_encodings[name]
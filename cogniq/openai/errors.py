@@ -0,0 +1,29 @@
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceHTTPError(Exception):
+    """Raised when an inference API answers with a non-200 status."""
+
+    def __init__(self, status: int, body: str, retry_after: float | None = None) -> None:
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+        super().__init__(f"Error {status}: {body}")
+
+    @property
+    def retryable(self) -> bool:
+        """Timeouts, conflicts, rate limits and server errors may succeed later; other 4xx will not."""
+        return self.status in (408, 409, 429) or self.status >= 500
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open, when no fallback model is configured."""
+
+    def __init__(self, endpoint: str, model: str) -> None:
+        self.endpoint = endpoint
+        self.model = model
+        super().__init__(f"Circuit open for {model} at {endpoint}")
@@ -0,0 +1,77 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import bisect
+from collections import deque
+
+# Upper bounds, in seconds, of the histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, float("inf"))
+
+
+class LatencyHistogram:
+    def __init__(self, *, window: int = 200):
+        """
+        Latencies of one endpoint and model: cumulative bucket counts,
+        plus a rolling window of recent samples for percentiles.
+        """
+        self.window: Deque[float] = deque(maxlen=window)
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.window.append(seconds)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, p: float) -> float | None:
+        if not self.window:
+            return None
+        ordered = sorted(self.window)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "buckets": {str(bound): n for bound, n in zip(LATENCY_BUCKETS, self.buckets)},
+        }
+
+
+class LatencyRecorder:
+    def __init__(self):
+        """
+        Latency histograms keyed by (kind, endpoint, model).
+        Kinds are "completion" for whole responses and "first_token" for streams.
+        """
+        self.histograms: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+
+    def histogram(self, *, kind: str, endpoint: str, model: str) -> LatencyHistogram:
+        key = (kind, endpoint, model)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        return histogram
+
+    def observe(self, *, kind: str, endpoint: str, model: str, seconds: float) -> None:
+        self.histogram(kind=kind, endpoint=endpoint, model=model).observe(seconds)
+
+    def percentile(self, *, kind: str, endpoint: str, model: str, p: float, min_samples: int = 1) -> float | None:
+        """
+        Returns None until there are at least min_samples recent samples.
+        """
+        histogram = self.histograms.get((kind, endpoint, model))
+        if histogram is None or len(histogram.window) < min_samples:
+            return None
+        return histogram.percentile(p)
+
+    def stats(self) -> Dict[str, Any]:
+        return {f"{kind} {endpoint} {model}": histogram.stats() for (kind, endpoint, model), histogram in self.histograms.items()}
@@ -0,0 +1,87 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+from cogniq.config import OPENAI_MODEL_ROUTES, OPENAI_CONTEXT_WINDOWS
+
+# Context window, in tokens, of the models we use. Overridable through OPENAI_CONTEXT_WINDOWS.
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 4097,
+    "gpt-3.5-turbo-0613": 4097,
+    "gpt-3.5-turbo-16k": 16385,
+    "gpt-3.5-turbo-1106": 16385,
+    "gpt-4": 8192,
+    "gpt-4-0613": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-1106-preview": 128000,
+    "pplx-70b-online": 4096,
+}
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        *,
+        routes: Dict[str, Dict[str, Any]] = OPENAI_MODEL_ROUTES,
+        context_windows: Dict[str, int] | None = None,
+    ):
+        """
+        Picks the model for a request from a named route.
+
+        A route is an ordered list of candidate models, most preferred first, and an optional latency budget:
+
+        ```
+        {"chat": {"candidates": [{"model": "gpt-3.5-turbo", "max_prompt_tokens": 100}, {"model": "gpt-4"}], "latency_budget": 20}}
+        ```
+
+        The first candidate is chosen whose context window fits the prompt and the response,
+        whose max_prompt_tokens (if any) is not exceeded, and whose observed p95 latency is within the budget.
+        When no candidate is fast enough, the fastest one that fits is chosen.
+        """
+        self.routes = routes
+        self.context_windows = {**CONTEXT_WINDOWS, **(context_windows if context_windows is not None else OPENAI_CONTEXT_WINDOWS)}
+
+    def choose(
+        self,
+        *,
+        route: str,
+        prompt_tokens: int,
+        max_tokens: int,
+        latency_budget: float | None = None,
+        observed_latency: Callable[[str], float | None] = lambda model: None,
+    ) -> str:
+        """
+        observed_latency: Returns the recent p95 latency of a model, or None when it is not known yet.
+        """
+        if route not in self.routes:
+            raise ValueError(f"Unknown model route: {route}. Known routes: {list(self.routes)}")
+        config = self.routes[route]
+        if latency_budget is None:
+            latency_budget = config.get("latency_budget")
+
+        fitting = []
+        for candidate in config["candidates"]:
+            model = candidate["model"]
+            context_window = self.context_windows.get(model)
+            if context_window is not None and prompt_tokens + max_tokens > context_window:
+                continue
+            if candidate.get("max_prompt_tokens") is not None and prompt_tokens > candidate["max_prompt_tokens"]:
+                continue
+            latency = observed_latency(model)
+            if latency_budget is None or latency is None or latency <= latency_budget:
+                logger.debug(f"route {route}: {model} for {prompt_tokens} prompt tokens (p95 {latency})")
+                return model
+            fitting.append((latency, model))
+
+        if fitting:
+            latency, model = min(fitting)
+            logger.info(f"route {route}: no model within {latency_budget}s, using the fastest, {model} (p95 {latency:.2f}s)")
+            return model
+
+        # Nothing fits; the largest context window has the best chance, and the API will report any overflow.
+        model = max(config["candidates"], key=lambda candidate: self.context_windows.get(candidate["model"], 0))["model"]
+        logger.warning(f"route {route}: {prompt_tokens} prompt tokens do not fit any candidate, using {model}")
+        return model
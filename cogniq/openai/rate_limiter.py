@@ -0,0 +1,144 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import asyncio
+import hashlib
+import time
+
+from cogniq.config import OPENAI_RATE_LIMIT_RPM, OPENAI_RATE_LIMIT_TPM, OPENAI_RATE_LIMITS
+
+
+class TokenBucket:
+    def __init__(self, *, capacity: float, period: float = 60.0):
+        """
+        A bucket of `capacity` units that refills continuously over `period` seconds.
+        """
+        self.capacity = capacity
+        self.period = period
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until `amount` units are available. Requests larger than the bucket wait for a full bucket.
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def set_capacity(self, capacity: float) -> None:
+        self._refill()
+        if capacity > 0 and capacity != self.capacity:
+            self.tokens = min(self.tokens, capacity)
+            self.capacity = capacity
+
+    def set_remaining(self, remaining: float) -> None:
+        """
+        Trusts the server's view when it has less capacity left than we thought.
+        """
+        self._refill()
+        self.tokens = min(self.tokens, remaining)
+
+
+class _Limits:
+    def __init__(self, *, rpm: float, tpm: float):
+        self.requests = TokenBucket(capacity=rpm)
+        self.tokens = TokenBucket(capacity=tpm)
+        # asyncio.Lock wakes waiters in FIFO order, so requests queue fairly
+        self.lock = asyncio.Lock()
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        *,
+        rpm: float = OPENAI_RATE_LIMIT_RPM,
+        tpm: float = OPENAI_RATE_LIMIT_TPM,
+        model_limits: Dict[str, Dict[str, float]] = OPENAI_RATE_LIMITS,
+    ):
+        """
+        Client-side requests-per-minute and tokens-per-minute limiter, per API key and model.
+
+        Requests wait in line until both buckets have capacity, rather than being sent to fail with a 429.
+        The buckets are adjusted from the `x-ratelimit-*` headers of every response.
+
+        rpm, tpm: Default limits.
+        model_limits: Per-model overrides, e.g. {"gpt-4": {"rpm": 500, "tpm": 10000}}.
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.model_limits = model_limits
+        self.limits: Dict[Tuple[str, str], _Limits] = {}
+        self.waited = 0.0
+
+    def _limits(self, *, api_key: str, model: str) -> _Limits:
+        key = (hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16], model)
+        limits = self.limits.get(key)
+        if limits is None:
+            overrides = self.model_limits.get(model, {})
+            limits = _Limits(rpm=overrides.get("rpm", self.rpm), tpm=overrides.get("tpm", self.tpm))
+            self.limits[key] = limits
+        return limits
+
+    async def acquire(self, *, api_key: str, model: str, tokens: int) -> None:
+        """
+        Waits until one request of `tokens` estimated tokens fits in the limits, then reserves it.
+        """
+        limits = self._limits(api_key=api_key, model=model)
+        async with limits.lock:
+            while True:
+                wait = max(limits.requests.wait_time(1), limits.tokens.wait_time(tokens))
+                if wait <= 0:
+                    limits.requests.take(1)
+                    limits.tokens.take(tokens)
+                    return
+                logger.debug("rate limiting %s for %.2fs", model, wait)
+                self.waited += wait
+                await asyncio.sleep(wait)
+
+    def update_from_headers(self, *, api_key: str, model: str, headers: Mapping[str, str]) -> None:
+        limits = self._limits(api_key=api_key, model=model)
+        for name, bucket in (("requests", limits.requests), ("tokens", limits.tokens)):
+            limit = _parse_float(headers.get(f"x-ratelimit-limit-{name}"))
+            if limit is not None:
+                bucket.set_capacity(limit)
+            remaining = _parse_float(headers.get(f"x-ratelimit-remaining-{name}"))
+            if remaining is not None:
+                bucket.set_remaining(remaining)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "waited_seconds": self.waited,
+            "buckets": {
+                f"{key}/{model}": {"requests": limits.requests.tokens, "tokens": limits.tokens.tokens}
+                for (key, model), limits in self.limits.items()
+            },
+        }
+
+
+def _parse_float(value: str | None) -> float | None:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
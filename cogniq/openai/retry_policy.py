@@ -0,0 +1,78 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import asyncio
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+from tenacity import RetryCallState, retry, retry_if_exception, stop_after_attempt
+from tenacity.wait import wait_base
+
+from .errors import InferenceHTTPError
+
+RETRY_MIN_WAIT = 1.0  # seconds
+RETRY_MAX_WAIT = 60.0  # seconds
+
+
+def is_retryable(exception: BaseException) -> bool:
+    """
+    Whether another attempt could succeed. Bad requests and auth errors are not retried.
+    """
+    if isinstance(exception, InferenceHTTPError):
+        return exception.retryable
+    return isinstance(exception, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def retry_wait(exception: BaseException | None, attempt: int) -> float:
+    """
+    Seconds to wait before the next attempt.
+    Honors Retry-After when the server sent one, otherwise backs off exponentially with full jitter.
+    """
+    retry_after = getattr(exception, "retry_after", None)
+    if retry_after is not None:
+        return min(RETRY_MAX_WAIT, retry_after) + random.uniform(0, RETRY_MIN_WAIT)
+    ceiling = min(RETRY_MAX_WAIT, RETRY_MIN_WAIT * 2**attempt)
+    return random.uniform(RETRY_MIN_WAIT, ceiling)
+
+
+class wait_retry_after(wait_base):
+    """tenacity wait strategy for retry_wait."""
+
+    def __call__(self, retry_state: RetryCallState) -> float:
+        exception = retry_state.outcome.exception() if retry_state.outcome else None
+        return retry_wait(exception, retry_state.attempt_number)
+
+
+def inference_retry(attempts: int) -> Callable:
+    """
+    Retries only retryable errors, honoring Retry-After, and re-raises the last error when giving up.
+    """
+    return retry(
+        stop=stop_after_attempt(attempts),
+        wait=wait_retry_after(),
+        retry=retry_if_exception(is_retryable),
+        reraise=True,
+    )
@@ -0,0 +1,121 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import asyncio
+import copy
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Coalesces identical in-flight requests.
+
+        The first caller for a key starts the request; callers arriving while it is in flight await the same result
+        instead of sending another one. The request runs in its own task, so one caller being cancelled
+        does not cancel it for the others. Every caller gets its own copy of the result, which it may modify.
+        """
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            logger.debug("coalesced in-flight request: %s", key)
+            return copy.deepcopy(await asyncio.shield(task))
+
+        task = asyncio.ensure_future(fn())
+        self.in_flight[key] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        self.started += 1
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self.in_flight), "started": self.started, "coalesced": self.coalesced}
+
+
+class _Broadcast:
+    def __init__(self):
+        self.deltas: List[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.changed: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.task: asyncio.Task | None = None
+        self.subscribers = 0
+
+    def notify(self) -> None:
+        changed = self.changed
+        self.changed = asyncio.get_running_loop().create_future()
+        if not changed.done():
+            changed.set_result(None)
+
+
+class StreamFanOut:
+    def __init__(self):
+        """
+        Coalesces identical in-flight streams.
+
+        The first subscriber for a key starts the stream; later subscribers receive every delta produced so far,
+        then follow the live stream. Each subscriber reads at its own pace. When the last subscriber stops reading,
+        the stream is cancelled.
+        """
+        self.in_flight: Dict[str, _Broadcast] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def subscribe(self, key: str, fn: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        broadcast = self.in_flight.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self.in_flight[key] = broadcast
+            self.started += 1
+            broadcast.task = asyncio.create_task(self._produce(key, broadcast, fn))
+        else:
+            self.coalesced += 1
+            logger.debug("coalesced in-flight stream: %s", key)
+
+        broadcast.subscribers += 1
+        try:
+            position = 0
+            while True:
+                if position < len(broadcast.deltas):
+                    yield broadcast.deltas[position]
+                    position += 1
+                elif broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                else:
+                    # Shielded, so that a cancelled subscriber does not cancel the wait of the others
+                    await asyncio.shield(broadcast.changed)
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                # Nobody reads the stream any more; stop paying for it, and let later arrivals start a fresh one
+                if self.in_flight.get(key) is broadcast:
+                    del self.in_flight[key]
+                broadcast.task.cancel()
+
+    async def _produce(self, key: str, broadcast: _Broadcast, fn: Callable[[], AsyncIterator[str]]) -> None:
+        try:
+            async for delta in fn():
+                broadcast.deltas.append(delta)
+                broadcast.notify()
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            # Later arrivals start a fresh stream
+            if self.in_flight.get(key) is broadcast:
+                del self.in_flight[key]
+            broadcast.done = True
+            broadcast.notify()
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self.in_flight), "started": self.started, "coalesced": self.coalesced}
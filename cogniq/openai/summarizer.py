@@ -5,7 +5,11 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-import tiktoken
+import asyncio
+import json
+import re
+from bisect import bisect_right
+from itertools import accumulate
 from functools import singledispatchmethod
 
 from cogniq.config import (
@@ -15,26 +19,105 @@ from cogniq.config import (
     OPENAI_MAX_TOKENS_PROMPT,
     OPENAI_MAX_TOKENS_RESPONSE,
     OPENAI_TOTAL_MAX_TOKENS,
+    OPENAI_SUMMARIZE_CONCURRENCY,
+    OPENAI_SUMMARIZE_MAX_DEPTH,
+    OPENAI_TOKENIZER_OFFLOAD_CHARS,
 )
 from .chat import system_message, user_message
+from .conversation import Conversation
+from .encoding import shared_encoding
+from .token_counter import TokenCountCache, shared_token_count_cache, tokenizer_executor
+
+SUMMARIZE_SYSTEM_PROMPT = "Please summarize the following content within the token limit."
+SUMMARIZE_PROMPT_OVERHEAD = 64  # tokens taken by the system prompt and message framing
+SUMMARIZE_MIN_CHUNK_TOKENS = 100
+# Split points, coarsest first; each keeps the separator with the preceding piece
+BOUNDARIES = (re.compile(r"(?<=\n\n)"), re.compile(r"(?<=\n)"), re.compile(r"(?<=[.!?])(?=\s)"))
 
 
 class Summarizer:
-    def __init__(self, *, async_chat_completion_create: Callable):
+    def __init__(self, *, async_chat_completion_create: Callable, token_counts: TokenCountCache | None = None):
         """
         Summarizer is intended as a subclass of CogniqOpenAI and is responsible for managing context window.
 
 
         async_chat_completion_create (function): Function to create a chat completion.
+        token_counts (TokenCountCache): Memoized token counts. Defaults to the cache shared by all summarizers.
 
         """
         self.async_chat_completion_create = async_chat_completion_create
 
-        self.encoding = tiktoken.encoding_for_model(OPENAI_CHAT_MODEL)
+        self.encoding = shared_encoding(OPENAI_CHAT_MODEL)
+        self.token_counts = token_counts or shared_token_count_cache()
+        self.precount([SUMMARIZE_SYSTEM_PROMPT])
+
+    def precount(self, texts: Iterable[str]) -> None:
+        """
+        Counts static texts, such as system prompts and function schemas, ahead of the requests that use them.
+        """
+        for text in texts:
+            self.token_counts.pin(self.encoding, text)
+
+    def count_functions(self, functions: List[Dict[str, Any]]) -> int:
+        """
+        Count tokens in function schemas. Pass the same schemas to precount_functions to count them once per process.
+        """
+        return sum(self.count_tokens(json.dumps(function)) for function in functions)
+
+    def precount_functions(self, functions: List[Dict[str, Any]]) -> None:
+        self.precount(json.dumps(function) for function in functions)
 
     def encode(self, text: str) -> List[int]:
         return self.encoding.encode(text)
 
+    async def awarm(self, texts: Iterable[str]) -> None:
+        """
+        Counts the uncached texts, so that the synchronous count_tokens calls that follow are cache hits.
+        Small amounts of text are encoded right away; from OPENAI_TOKENIZER_OFFLOAD_CHARS on, the texts are
+        encoded as one batch in the tokenizer thread pool, keeping the event loop responsive.
+        """
+        missing = self.token_counts.missing(self.encoding, texts)
+        if not missing:
+            return
+        if sum(map(len, missing)) < OPENAI_TOKENIZER_OFFLOAD_CHARS:
+            counts = [len(self.encoding.encode(text)) for text in missing]
+        else:
+            counts = await asyncio.get_running_loop().run_in_executor(tokenizer_executor(), self._encode_batch_counts, missing)
+        self.token_counts.store(self.encoding, missing, counts)
+
+    def _encode_batch_counts(self, texts: List[str]) -> List[int]:
+        if len(texts) == 1:
+            return [len(self.encoding.encode(texts[0]))]
+        return [len(tokens) for tokens in self.encoding.encode_batch(texts)]
+
+    def _texts(self, value: str | Sequence[Union[Dict[str, str], str]]) -> List[str]:
+        if isinstance(value, str):
+            return [value]
+        if isinstance(value, Conversation):
+            return [message.content for message in value.messages()]
+        return [item if isinstance(item, str) else item["content"] for item in value if isinstance(item, str) or "content" in item]
+
+    async def acount_tokens(self, value: str | Sequence[Union[Dict[str, str], str]]) -> int:
+        """
+        count_tokens, encoding large texts off the event loop.
+        """
+        await self.awarm(self._texts(value))
+        return self.count_tokens(value)
+
+    async def aceil_history(self, message_history: Sequence[Dict[str, str]], max_tokens: int | None = None) -> Conversation:
+        """
+        ceil_history, encoding large histories off the event loop.
+        """
+        await self.awarm(self._texts(message_history))
+        return self.ceil_history(message_history, max_tokens)
+
+    async def aceil_retrieval(self, retrieval: List[str], max_tokens: int | None = None) -> List[str]:
+        """
+        ceil_retrieval, encoding large retrievals off the event loop.
+        """
+        await self.awarm(retrieval)
+        return self.ceil_retrieval(retrieval, max_tokens)
+
     @singledispatchmethod
     def count_tokens(self, text: Any) -> int:
         logger.error("Unsupported type passed to count_tokens: %s (%s)", type(text), text)
@@ -43,11 +126,15 @@ class Summarizer:
     @count_tokens.register(str)
     def _(self, text: str) -> int:
         try:
-            return len(self.encode(text))
+            return self.token_counts.count(self.encoding, text)
         except TypeError as e:
             logger.error("ceil_history expects a string. Message: %s", text)
             raise e
 
+    @count_tokens.register(Conversation)
+    def _(self, conversation: Conversation) -> int:
+        return conversation.count_tokens(key=self.encoding.name, count=self.count_tokens)
+
     @count_tokens.register(list)
     def _(self, history: List[Union[Dict[str, str], str]]) -> int:
         """
@@ -63,24 +150,16 @@ class Summarizer:
             return sum(map(self.count_tokens, history))
         return 0
 
-    def ceil_history(self, message_history: List[Dict[str, str]], max_tokens: int | None = None) -> List[Dict[str, str]]:
+    def ceil_history(self, message_history: Sequence[Dict[str, str]], max_tokens: int | None = None) -> Conversation:
         """
         Ceil the history to a maximum number of tokens.
         Removes entries from the BEGINNING of the history until the total number of tokens is less than max_tokens.
+        Returns a view of the history; the history itself is not modified.
         """
         if max_tokens is None:
-            max_tokens = OPENAI_MAX_TOKENS_HISTORY
-
-        message_history_copy = message_history.copy()
-
-        total_tokens = self.count_tokens(message_history_copy)
+            max_tokens = int(OPENAI_MAX_TOKENS_HISTORY)
 
-        while total_tokens > max_tokens:
-            logger.debug("trimming ceil_history: total_tokens: %s", total_tokens)
-            popped_message = message_history_copy.pop(0)
-            total_tokens -= self.count_tokens([popped_message])
-
-        return message_history_copy
+        return Conversation(message_history).ceil_start(max_tokens, key=self.encoding.name, count=self.count_tokens)
 
     def ceil_retrieval(self, retrieval: List[str], max_tokens: int | None = None) -> List[str]:
         """
@@ -88,53 +167,96 @@ class Summarizer:
         Removes entries from the END of the retrieval until the total number of tokens is less than max_tokens.
         """
         if max_tokens is None:
-            max_tokens = OPENAI_MAX_TOKENS_RETRIEVAL
-
-        retrieval_copy = retrieval.copy()
-
-        total_tokens = self.count_tokens(retrieval_copy)
+            max_tokens = int(OPENAI_MAX_TOKENS_RETRIEVAL)
 
-        while total_tokens > max_tokens:
-            retrieval_copy = retrieval_copy[:-1]  # removed last message
-            total_tokens = self.count_tokens(retrieval_copy)
-
-        return retrieval_copy
+        prefix_sums = list(accumulate(map(self.count_tokens, retrieval)))
+        return retrieval[: bisect_right(prefix_sums, max_tokens)]
 
     async def ceil_prompt(self, prompt: str, max_tokens: int | None = None) -> str:
         if max_tokens is None:
             max_tokens = OPENAI_MAX_TOKENS_PROMPT
 
         simple_coerced_string = str(prompt)
-        if self.count_tokens(simple_coerced_string) > max_tokens:
+        if await self.acount_tokens(simple_coerced_string) > max_tokens:
             return await self.summarize_content(simple_coerced_string, OPENAI_MAX_TOKENS_PROMPT)
         else:
             return prompt
 
     async def summarize_content(self, content: str, max_tokens=None) -> str:
+        """
+        Summarizes content to fit within max_tokens, by map-reduce when it does not fit one request.
+
+        Content too large for one request is split on paragraph and sentence boundaries into chunks that each fit,
+        the chunks are summarized concurrently, each to its share of max_tokens, and the joined summaries are reduced
+        the same way until they fit. Every level shrinks the content by about chunk size / share, so a few levels suffice;
+        after OPENAI_SUMMARIZE_MAX_DEPTH levels the result is truncated.
+        """
         if max_tokens is None:
             max_tokens = OPENAI_MAX_TOKENS_PROMPT
-        content_length = self.count_tokens(content)
-        remaining_context_window = OPENAI_TOTAL_MAX_TOKENS - max_tokens
-
-        if content_length < max_tokens:
-            return content
-
-        if remaining_context_window < content_length:
-            half = int(len(content) / 2)
-            a = await self.summarize_content(content[0:half], max_tokens)
-            b = await self.summarize_content(content[half:], max_tokens)
-            return a + b
-
-        response = await self.async_chat_completion_create(
-            messages=[
-                system_message("Please summarize the following content within the token limit."),
-                user_message(content),
-            ],
-            temperature=0.7,
-            max_tokens=max_tokens,
-            top_p=1,
-            frequency_penalty=0.5,
-            presence_penalty=0,
-        )
+        max_tokens = int(max_tokens)
+        chunk_tokens = max(int(OPENAI_TOTAL_MAX_TOKENS) - max_tokens - SUMMARIZE_PROMPT_OVERHEAD, SUMMARIZE_MIN_CHUNK_TOKENS)
+        semaphore = asyncio.Semaphore(OPENAI_SUMMARIZE_CONCURRENCY)
+
+        for depth in range(OPENAI_SUMMARIZE_MAX_DEPTH):
+            content_length = await self.acount_tokens(content)
+            if content_length < max_tokens:
+                return content
+            if content_length <= chunk_tokens:
+                return await self._summarize_chunk(content, max_tokens, semaphore)
+
+            await self.awarm(BOUNDARIES[0].split(content))
+            chunks = self.split_content(content, chunk_tokens)
+            chunk_max_tokens = max(max_tokens // len(chunks), SUMMARIZE_MIN_CHUNK_TOKENS)
+            logger.info("summarize_content level %s: %s tokens in %s chunks", depth, content_length, len(chunks))
+            summaries = await asyncio.gather(*(self._summarize_chunk(chunk, chunk_max_tokens, semaphore) for chunk in chunks))
+            content = "\n\n".join(summaries)
+
+        logger.warning("summarize_content did not converge in %s levels, truncating", OPENAI_SUMMARIZE_MAX_DEPTH)
+        return self.encoding.decode(self.encode(content)[:max_tokens])
+
+    async def _summarize_chunk(self, content: str, max_tokens: int, semaphore: asyncio.Semaphore) -> str:
+        async with semaphore:
+            response = await self.async_chat_completion_create(
+                messages=[
+                    system_message(SUMMARIZE_SYSTEM_PROMPT),
+                    user_message(content),
+                ],
+                temperature=0.7,
+                max_tokens=max_tokens,
+                top_p=1,
+                frequency_penalty=0.5,
+                presence_penalty=0,
+                cache=True,
+            )
         summary = response["choices"][0]["message"]["content"].strip()
         return summary
+
+    def split_content(self, content: str, chunk_tokens: int) -> List[str]:
+        """
+        Splits content into chunks of at most chunk_tokens, preferring paragraph, then sentence boundaries.
+        A sentence longer than a chunk is split between tokens.
+        """
+        chunks: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+        for piece, piece_tokens in self._pieces(content, chunk_tokens, BOUNDARIES):
+            if current and current_tokens + piece_tokens > chunk_tokens:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+        if current:
+            chunks.append("".join(current))
+        return chunks
+
+    def _pieces(self, text: str, chunk_tokens: int, boundaries: Sequence[re.Pattern]) -> Iterator[Tuple[str, int]]:
+        for piece in boundaries[0].split(text) if boundaries else [text]:
+            piece_tokens = self.count_tokens(piece)
+            if piece_tokens <= chunk_tokens:
+                yield piece, piece_tokens
+            elif len(boundaries) > 1:
+                yield from self._pieces(piece, chunk_tokens, boundaries[1:])
+            else:
+                tokens = self.encode(piece)
+                for i in range(0, len(tokens), chunk_tokens):
+                    yield self.encoding.decode(tokens[i : i + chunk_tokens]), len(tokens[i : i + chunk_tokens])
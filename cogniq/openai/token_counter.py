@@ -0,0 +1,117 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from cogniq.config import OPENAI_TOKEN_COUNT_CACHE_MAX_ENTRIES, OPENAI_TOKENIZER_THREADS
+
+
+class TokenCountCache:
+    def __init__(self, *, max_entries: int = OPENAI_TOKEN_COUNT_CACHE_MAX_ENTRIES):
+        """
+        Memoizes token counts across requests, keyed by encoding name and a hash of the text.
+
+        The same thread history is counted by every personality, by the evaluator, and again on the next turn;
+        with this cache each message is encoded once. Entries are evicted least recently used beyond max_entries.
+        Pinned entries, e.g. static prompts and function schemas, are never evicted.
+        """
+        self.max_entries = max_entries
+        self.entries: OrderedDict[Tuple[str, bytes], int] = OrderedDict()
+        self.pinned: Dict[Tuple[str, bytes], int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(encoding: Any, text: str) -> Tuple[str, bytes]:
+        return encoding.name, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def _lookup(self, key: Tuple[str, bytes]) -> int | None:
+        count = self.pinned.get(key)
+        if count is None:
+            count = self.entries.get(key)
+            if count is not None:
+                self.entries.move_to_end(key)
+        return count
+
+    def _store(self, key: Tuple[str, bytes], count: int) -> None:
+        self.entries[key] = count
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def count(self, encoding: Any, text: str) -> int:
+        key = self._key(encoding, text)
+        count = self._lookup(key)
+        if count is not None:
+            self.hits += 1
+            return count
+
+        self.misses += 1
+        count = len(encoding.encode(text))
+        self._store(key, count)
+        return count
+
+    def missing(self, encoding: Any, texts: Iterable[str]) -> List[str]:
+        """
+        The distinct texts whose counts are not cached.
+        """
+        missing: Dict[Tuple[str, bytes], str] = {}
+        for text in texts:
+            key = self._key(encoding, text)
+            if key not in missing and self._lookup(key) is None:
+                missing[key] = text
+        return list(missing.values())
+
+    def store(self, encoding: Any, texts: Sequence[str], counts: Sequence[int]) -> None:
+        self.misses += len(texts)
+        for text, count in zip(texts, counts):
+            self._store(self._key(encoding, text), count)
+
+    def pin(self, encoding: Any, text: str) -> int:
+        """
+        Counts text now and keeps its count for the life of the process.
+        """
+        key = self._key(encoding, text)
+        if key not in self.pinned:
+            self.pinned[key] = self.count(encoding, text)
+        return self.pinned[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+            "pinned": len(self.pinned),
+        }
+
+
+_shared_token_count_cache: TokenCountCache | None = None
+_tokenizer_executor: ThreadPoolExecutor | None = None
+
+
+def shared_token_count_cache() -> TokenCountCache:
+    """
+    The process-wide token count cache, shared by all Summarizer instances.
+    """
+    global _shared_token_count_cache
+    if _shared_token_count_cache is None:
+        _shared_token_count_cache = TokenCountCache()
+    return _shared_token_count_cache
+
+
+def tokenizer_executor() -> ThreadPoolExecutor:
+    """
+    The process-wide thread pool for large encodings. tiktoken releases the GIL while encoding,
+    so these threads run in parallel with the event loop.
+    """
+    global _tokenizer_executor
+    if _tokenizer_executor is None:
+        _tokenizer_executor = ThreadPoolExecutor(max_workers=OPENAI_TOKENIZER_THREADS, thread_name_prefix="tokenizer")
+    return _tokenizer_executor
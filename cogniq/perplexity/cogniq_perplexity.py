@@ -10,12 +10,12 @@ import json
 import aiohttp
 from tenacity import retry, stop_after_attempt, wait_exponential
 
-from cogniq.config import PERPLEXITY_API_KEY
+from cogniq.config import PERPLEXITY_API_BASE, PERPLEXITY_API_KEY
 from cogniq.openai import CogniqOpenAI
 
 
 class CogniqPerplexity(CogniqOpenAI):
-    CHAT_COMPLETIONS_URL = "https://api.perplexity.ai/chat/completions"
+    CHAT_COMPLETIONS_URL = f"{PERPLEXITY_API_BASE}/chat/completions"
     COMPLETIONS_URL = "https://notimplemented.example.com/"
     API_KEY = PERPLEXITY_API_KEY
 
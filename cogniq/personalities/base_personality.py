@@ -7,13 +7,14 @@ logger = logging.getLogger(__name__)
 
 from abc import ABC, abstractmethod
 
-from cogniq.slack import CogniqSlack
-from cogniq.openai import system_message, user_message, CogniqOpenAI
+from cogniq.slack import CogniqSlack, SlackStreamWriter
+from cogniq.openai import system_message, user_message, CogniqOpenAI, Conversation
 from cogniq.perplexity import CogniqPerplexity
+from cogniq.anthropic import CogniqAnthropic
 
 
 class BasePersonality(ABC):
-    def __init__(self, cslack: CogniqSlack, inference_backend: CogniqOpenAI | CogniqPerplexity):
+    def __init__(self, cslack: CogniqSlack, inference_backend: CogniqOpenAI | CogniqPerplexity | CogniqAnthropic):
         """
         Initialize the BasePersonality.
         :param cslack: CogniqSlack instance.
@@ -43,13 +44,14 @@ class BasePersonality(ABC):
         """
         Perform any asynchronous setup tasks that are necessary for the personalityto function properly.
         """
-        pass
+        await self.inference_backend.async_setup()
 
-    async def history(self, *, event: Dict[str, str], context: Dict[str, Any]) -> List[Dict[str, str]]:
+    async def history(self, *, event: Dict[str, str], context: Dict[str, Any]) -> Conversation:
         """
-        Returns the history of the event.
+        Returns the history of the event: for threads, a rolling summary of the older messages followed by the recent ones,
+        within OPENAI_MAX_TOKENS_HISTORY.
         """
-        return await self.cslack.openai_history.get_history(event=event, context=context)
+        return await self.cslack.rolling_history.get_history(event=event, context=context, summarizer=self.inference_backend.summarizer)
 
     async def ask_task(self, *, event: Dict[str, str], reply_ts: str, context: Dict[str, Any], thread_ts: str, **kwargs) -> None:
         channel = event["channel"]
@@ -58,17 +60,24 @@ class BasePersonality(ABC):
             logger.debug("I think the message was deleted. Ignoring.")
             return
 
-        history = await self.cslack.openai_history.get_history(event=event, context=context)
+        history = await self.history(event=event, context=context)
         # logger.debug(f"history: {history}")
 
-        ask_response = await self.ask(q=message, message_history=history, context=context, reply_ts=reply_ts, thread_ts=thread_ts)
-        await self.cslack.chat_update(channel=channel, ts=reply_ts, context=context, text=ask_response["answer"])
+        # Stream the answer into the reply as it is generated
+        writer = SlackStreamWriter(cslack=self.cslack, channel=channel, ts=reply_ts, thread_ts=thread_ts, context=context)
+        ask_response = {"answer": ""}
+        try:
+            ask_response = await self.ask(
+                q=message, message_history=history, context=context, stream_callback=writer, reply_ts=reply_ts, thread_ts=thread_ts
+            )
+        finally:
+            await writer.close(final_text=ask_response["answer"])
 
     async def ask_directly(
         self,
         *,
         q: str,
-        message_history: List[Dict[str, str]],
+        message_history: Sequence[Dict[str, str]],
         context: Dict[str, Any],
         stream_callback: Callable[..., None] | None = None,
         reply_ts: str | None = None,
@@ -86,7 +95,7 @@ class BasePersonality(ABC):
         self,
         *,
         q: str,
-        message_history: List[Dict[str, str]],
+        message_history: Sequence[Dict[str, str]],
         context: Dict[str, Any],
         stream_callback: Callable[..., None] | None = None,
         reply_ts: str | None = None,
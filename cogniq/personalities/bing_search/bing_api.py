@@ -0,0 +1,63 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import requests
+from haystack.nodes.search_engine.providers import BingAPI
+from haystack.schema import Document
+
+from cogniq.config import BING_SEARCH_ENDPOINT
+
+
+class EndpointBingAPI(BingAPI):
+    """
+    haystack's BingAPI, querying BING_SEARCH_ENDPOINT instead of the hardcoded public endpoint,
+    so that searches can go to a regional endpoint or to the local stand-in.
+    """
+
+    def __init__(self, *, endpoint: str = BING_SEARCH_ENDPOINT, **kwargs):
+        super().__init__(**kwargs)
+        self.url = f"{endpoint.rstrip('/')}/v7.0/search"
+
+    def search(self, query: str, **kwargs) -> List[Document]:
+        kwargs = {**self.kwargs, **kwargs}
+        top_k = kwargs.pop("top_k", self.top_k)
+
+        allowed_domains = kwargs.pop("allowed_domains", self.allowed_domains)
+        query_prepend = "OR ".join(f"site:{domain} " for domain in allowed_domains) if allowed_domains else ""
+        params: Dict[str, Union[str, int, float]] = {"q": query_prepend + query, "count": 50, **kwargs}
+        headers = {"Ocp-Apim-Subscription-Key": self.api_key}
+
+        response = requests.get(self.url, headers=headers, params=params, timeout=10)
+        if response.status_code != 200:
+            raise Exception(f"Error while querying {self.__class__.__name__}: {response.text}")
+
+        documents: List[Document] = []
+        for web_page in response.json()["webPages"]["value"]:
+            documents.append(
+                Document.from_dict(
+                    {
+                        "title": web_page["name"],
+                        "content": web_page["snippet"],
+                        "position": int(web_page["id"].rsplit(".", 1)[-1]),
+                        "link": web_page["url"],
+                        "language": web_page["language"],
+                    }
+                )
+            )
+            for deep_link in web_page.get("deepLinks") or []:
+                documents.append(
+                    Document.from_dict(
+                        {
+                            "title": deep_link["name"],
+                            "content": deep_link.get("snippet") or deep_link["name"],
+                            "link": deep_link["url"],
+                        }
+                    )
+                )
+
+        logger.debug("Bing API returned %s documents for the query '%s'", len(documents), query)
+        return documents[:top_k]
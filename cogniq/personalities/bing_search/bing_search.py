@@ -10,7 +10,7 @@ from haystack.agents import Agent, Tool
 from haystack.agents.base import ToolsManager
 from haystack.nodes import PromptNode
 
-from cogniq.config import OPENAI_API_KEY, OPENAI_MAX_TOKENS_RESPONSE
+from cogniq.config import OPENAI_API_BASE, OPENAI_API_KEY, OPENAI_MAX_TOKENS_RESPONSE
 from cogniq.personalities import BasePersonality
 from cogniq.slack import CogniqSlack
 from cogniq.openai import (
@@ -45,6 +45,7 @@ class BingSearch(BasePersonality):
             api_key=OPENAI_API_KEY,
             max_length=OPENAI_MAX_TOKENS_RESPONSE,
             stop_words=["Observation:"],
+            model_kwargs={"api_base": OPENAI_API_BASE},
         )
 
     @property
@@ -59,7 +60,7 @@ class BingSearch(BasePersonality):
         self,
         *,
         q: str,
-        message_history: List[Dict[str, str]],
+        message_history: Sequence[Dict[str, str]],
         context: Dict[str, Any],
         stream_callback: Callable[..., None] | None = None,
         reply_ts: str | None = None,
@@ -78,7 +79,7 @@ class BingSearch(BasePersonality):
         self,
         *,
         q: str,
-        message_history: List[Dict[str, str]],
+        message_history: Sequence[Dict[str, str]],
         context: Dict[str, Any],
         stream_callback: Callable[..., None] | None = None,
         reply_ts: str | None = None,
@@ -111,7 +112,7 @@ class BingSearch(BasePersonality):
             final_answer_text = summarized_transcript
         return {"answer": final_answer_text, "response": agent_response}
 
-    async def _get_history_augmented_prompt(self, *, q: str, message_history: List[Dict[str, str]], context: Dict[str, Any]) -> str:
+    async def _get_history_augmented_prompt(self, *, q: str, message_history: Sequence[Dict[str, str]], context: Dict[str, Any]) -> str:
         """
         Returns a prompt augmented with the message history.
         """
@@ -119,7 +120,7 @@ class BingSearch(BasePersonality):
         bot_name = await self.cslack.openai_history.get_bot_name(context=context)
 
         # if the history is too long, summarize it
-        message_history = self.inference_backend.summarizer.ceil_history(message_history)
+        message_history = await self.inference_backend.summarizer.aceil_history(message_history)
 
         # Set the system message
         message_history = [system_message(f"Hello, I am {bot_name}. I am a slack bot that can answer your questions.")] + message_history
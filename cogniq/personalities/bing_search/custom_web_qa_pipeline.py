@@ -17,7 +17,9 @@ from haystack.pipelines.base import Pipeline
 from haystack.nodes.retriever.web import WebRetriever
 from haystack.nodes.preprocessor import PreProcessor
 
-from cogniq.config import BING_SUBSCRIPTION_KEY, OPENAI_API_KEY, OPENAI_MAX_TOKENS_RESPONSE
+from cogniq.config import BING_SUBSCRIPTION_KEY, OPENAI_API_BASE, OPENAI_API_KEY, OPENAI_MAX_TOKENS_RESPONSE
+
+from .bing_api import EndpointBingAPI
 
 
 class CustomWebQAPipeline(BaseStandardPipeline):
@@ -32,7 +34,7 @@ class CustomWebQAPipeline(BaseStandardPipeline):
 
         self.web_retriever = WebRetriever(
             api_key=BING_SUBSCRIPTION_KEY,
-            search_engine_provider="BingAPI",
+            search_engine_provider=EndpointBingAPI(api_key=BING_SUBSCRIPTION_KEY),
             top_k=5,
             mode="preprocessed_documents",
             preprocessor=PreProcessor(progress_bar=False),
@@ -46,7 +48,7 @@ class CustomWebQAPipeline(BaseStandardPipeline):
             api_key=OPENAI_API_KEY,
             max_length=OPENAI_MAX_TOKENS_RESPONSE,
             default_prompt_template=web_retriever_prompt,
-            model_kwargs={"temperature": 0.2},
+            model_kwargs={"temperature": 0.2, "api_base": OPENAI_API_BASE},
         )
         self.pipeline.add_node(component=prompt_node, name="PromptNode", inputs=["Retriever"])
 
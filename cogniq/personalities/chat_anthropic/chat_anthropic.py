@@ -4,9 +4,7 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-from haystack.nodes.prompt.invocation_layer import AnthropicClaudeInvocationLayer
-
-from cogniq.config import ANTHROPIC_API_KEY
+from cogniq.openai import user_message
 from cogniq.personalities import BasePersonality
 from cogniq.slack import CogniqSlack
 
@@ -20,42 +18,27 @@ class ChatAnthropic(BasePersonality):
     def name(self) -> str:
         return "Anthropic Claude"
 
-    async def history(self, *, event: Dict[str, str], context: Dict[str, Any]) -> List[Dict[str, str]]:
-        """
-        Returns the history of the event.
-        """
-        return await self.cslack.anthropic_history.get_history(event=event, context=context)
-
     async def ask(
         self,
         *,
         q: str,
-        message_history: List[Dict[str, str]],
+        message_history: Sequence[Dict[str, str]],
         context: Dict[str, Any],
         stream_callback: Callable[..., None] | None = None,
         reply_ts: str | None = None,
         thread_ts: str | None = None,
     ) -> Dict[str, Any]:
-        # disregard provided message_history and fetch from cslack
-        message_history = await self.history(event=context["event"], context=context)
-
-        stream_callback_set = stream_callback is not None
-        kwargs = {
-            "model": "claude-2",
-            "max_tokens_to_sample": 100000,
-            "temperature": 1,
-            "top_p": -1,  # disabled
-            "top_k": -1,
-            "stop_sequences": ["\n\nHuman: "],
-            "stream": stream_callback_set,
-            "stream_handler": stream_callback,
-        }
-
-        api_key = ANTHROPIC_API_KEY
-        layer = AnthropicClaudeInvocationLayer(api_key=api_key, **kwargs)
-        newprompt = f"{message_history}\n\nHuman: {q}"
-        res = layer.invoke(prompt=newprompt)
-
-        logger.info(f"res: {res}")
-        answer = "".join(res)
+        if message_history is None:
+            message_history = []
+
+        # The inference backend is a CogniqAnthropic, which converts the chat messages to Claude's prompt format
+        res = await self.inference_backend.async_chat_completion_create(
+            messages=message_history + [user_message(q)],
+            stream_callback=stream_callback,
+            temperature=1,
+            stop_sequences=["\n\nHuman:"],
+        )
+
+        answer = res["choices"][0]["message"]["content"]
+        logger.info(f"final_answer: {answer}")
         return {"answer": answer, "response": res}
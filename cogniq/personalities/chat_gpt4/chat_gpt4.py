@@ -24,7 +24,7 @@ class ChatGPT4(BasePersonality):
         self,
         *,
         q: str,
-        message_history: List[Dict[str, str]],
+        message_history: Sequence[Dict[str, str]],
         context: Dict[str, Any],
         stream_callback: Callable[..., None] | None = None,
         reply_ts: str | None = None,
@@ -33,12 +33,12 @@ class ChatGPT4(BasePersonality):
         if message_history is None:
             message_history = []
 
-        message_history.append(user_message(q))
+        message_history = message_history + [user_message(q)]
 
         res = await self.inference_backend.async_chat_completion_create(
             messages=message_history,
             stream_callback=stream_callback,
-            model="gpt-4",  # [gpt-4-32k, gpt-4, gpt-3.5-turbo]
+            route="chat",
         )
 
         answer = res["choices"][0]["message"]["content"]
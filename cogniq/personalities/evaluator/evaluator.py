@@ -7,17 +7,12 @@ import asyncio
 from functools import partial
 
 from cogniq.personalities import BasePersonality
-from cogniq.slack import CogniqSlack
+from cogniq.slack import CogniqSlack, StreamPublisher, SlackStreamWriter, tail_renderer
 from cogniq.openai import system_message, user_message, CogniqOpenAI
 
 from .prompts import evaluator_prompt
 
 
-class Buffer:
-    def __init__(self):
-        self.text = ""
-
-
 class Evaluator(BasePersonality):
     @property
     def description(self) -> str:
@@ -42,30 +37,31 @@ class Evaluator(BasePersonality):
             return
         short_q = await self.inference_backend.summarizer.ceil_prompt(q)
 
-        # create a buffer for each personality
-        response_buffers = {p.name: Buffer() for p in personalities}
-        for name, buf in response_buffers.items():
-            buf.text += f"-------------------------\n{name} Stream of Thought:\n"
+        # stream each personality's thoughts into the reply, one buffer per personality, showing the end of each
+        publisher = StreamPublisher(cslack=self.cslack, channel=channel, ts=reply_ts, context=context, render=tail_renderer())
+        response_buffers = {
+            p.name: publisher.add_buffer(p.name, f"-------------------------\n{p.name} Stream of Thought:\n") for p in personalities
+        }
 
         def stream_callback(name: str, token: str, **kwargs) -> None:
-            setattr(response_buffers[name], "text", response_buffers[name].text + token)
+            response_buffers[name].append(token)
 
         # Wrap personalities and their callbacks in a dict of dicts
         ask_personalities = {
             p.name: {"personality": p, "stream_callback": partial(stream_callback, p.name), "reply_ts": reply_ts} for p in personalities
         }
 
-        buffer_post_end = asyncio.Event()  # event flag for ending the buffer_and_post loop
-        buffer_and_post_task = asyncio.create_task(
-            self.buffer_and_post(
-                response_buffers=response_buffers,
-                channel=channel,
-                reply_ts=reply_ts,
-                context=context,
-                interval=1,
-                buffer_post_end=buffer_post_end,
-            )
+        # The evaluation replaces the stream of thought as it is generated
+        writer = SlackStreamWriter(
+            cslack=self.cslack, channel=channel, ts=reply_ts, thread_ts=event.get("thread_ts", event["ts"]), context=context
         )
+
+        async def stream_evaluation(token: str, **kwargs) -> None:
+            if not publisher.closed:
+                await publisher.close()
+            writer.write(token)
+
+        publisher.start()
         message_history = await self.history(event=event, context=context)
 
         ask_response = {"answer": ""}
@@ -76,41 +72,22 @@ class Evaluator(BasePersonality):
                     message_history=message_history,
                     personalities=ask_personalities,
                     context=context,
+                    stream_callback=stream_evaluation,
                 ),
                 buffer_post_timeout,
             )
         finally:
-            buffer_post_end.set()  # end the buffer_and_post loop
-            await buffer_and_post_task  # ensure buffer_and_post task is finished
-            await self.cslack.chat_update(channel=channel, ts=reply_ts, text=ask_response["answer"], context=context)
-
-    async def buffer_and_post(
-        self,
-        *,
-        response_buffers: Dict,
-        channel: str,
-        reply_ts: str,
-        context: Dict[str, Any],
-        interval: int,
-        buffer_post_end: asyncio.Event,
-    ) -> None:
-        while not buffer_post_end.is_set():
-            combined_text = "\n".join(buf.text for buf in response_buffers.values())
-            if combined_text:
-                await self.cslack.chat_update(
-                    channel=channel,
-                    ts=reply_ts,
-                    context=context,
-                    text=combined_text,
-                    retry_on_rate_limit=False,
-                )
-            await asyncio.sleep(interval)
+            try:
+                if not publisher.closed:
+                    await publisher.close()
+            finally:
+                await writer.close(final_text=ask_response["answer"])
 
     async def ask(
         self,
         *,
         q: str,
-        message_history: List[Dict[str, str]],
+        message_history: Sequence[Dict[str, str]],
         context: Dict[str, Any],
         stream_callback: Callable[..., None] | None = None,
         reply_ts: str | None = None,
@@ -122,19 +99,23 @@ class Evaluator(BasePersonality):
         self,
         *,
         q: str,
-        message_history: List[dict[str, str]],
+        message_history: Sequence[Dict[str, str]],
         context: Dict[str, Any],
         personalities: Dict[str, Dict[str, Any]],
+        stream_callback: Callable[..., Any] | None = None,
     ) -> Dict[str, Any]:
+        """
+        Asks the personalities concurrently, then evaluates their answers. stream_callback receives the evaluation as it is generated.
+        """
         response_futures = []
         # Run the personalities
         for name, info in personalities.items():
             personality = info["personality"]
-            stream_callback = info["stream_callback"]
+            personality_callback = info["stream_callback"]
             reply_ts = info["reply_ts"]
             response_future = asyncio.create_task(
                 personality.ask_directly(
-                    q=q, message_history=message_history, stream_callback=stream_callback, context=context, reply_ts=reply_ts
+                    q=q, message_history=message_history, stream_callback=personality_callback, context=context, reply_ts=reply_ts
                 )
             )
             response_futures.append((personality.description, response_future))
@@ -164,11 +145,12 @@ class Evaluator(BasePersonality):
         else:
             logger.info(f"Evaluating prompt: {short_prompt}")
 
-        message_history.append(user_message(short_prompt))
+        message_history = message_history + [user_message(short_prompt)]
 
         response = await self.inference_backend.async_chat_completion_create(
             messages=message_history,
-            model="gpt-4",  # [gpt-4-32k, gpt-4, gpt-3.5-turbo]
+            stream_callback=stream_callback,
+            route="evaluate",
         )
 
         answer = response["choices"][0]["message"]["content"]
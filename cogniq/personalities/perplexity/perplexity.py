@@ -25,7 +25,7 @@ class Perplexity(BasePersonality):
         self,
         *,
         q: str,
-        message_history: List[Dict[str, str]],
+        message_history: Sequence[Dict[str, str]],
         context: Dict[str, Any],
         stream_callback: Callable[..., None] | None = None,
         reply_ts: str | None = None,
@@ -34,7 +34,7 @@ class Perplexity(BasePersonality):
         if message_history is None:
             message_history = []
 
-        message_history.append(user_message(q))
+        message_history = message_history + [user_message(q)]
 
         res = await self.inference_backend.async_chat_completion_create(
             messages=message_history,
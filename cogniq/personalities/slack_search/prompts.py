@@ -7,6 +7,8 @@ logger = logging.getLogger(__name__)
 
 from functools import singledispatch
 
+search_query_system_prompt = "I am an expert at using Slack's keyword and phrase search to search Slack for the relevant context to answer your question. I have the capabilities to access and retrieve historic slack messages."
+
 
 @singledispatch
 def formatted_responses(responses: Any) -> str:
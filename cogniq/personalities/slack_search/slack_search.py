@@ -10,7 +10,7 @@ from cogniq.personalities import BasePersonality
 from cogniq.openai import system_message, user_message, CogniqOpenAI
 from cogniq.slack import CogniqSlack, UserTokenNoneError
 
-from .prompts import retrieval_augmented_prompt
+from .prompts import retrieval_augmented_prompt, search_query_system_prompt
 from .functions import get_search_query_function
 
 
@@ -23,11 +23,16 @@ class SlackSearch(BasePersonality):
     def name(self) -> str:
         return "Slack Search"
 
+    async def async_setup(self) -> None:
+        await super().async_setup()
+        self.inference_backend.summarizer.precount([search_query_system_prompt])
+        self.inference_backend.summarizer.precount_functions([get_search_query_function])
+
     async def ask(
         self,
         *,
         q: str,
-        message_history: List[Dict[str, str]],
+        message_history: Sequence[Dict[str, str]],
         context: Dict[str, Any],
         stream_callback: Callable[..., None] | None = None,
         reply_ts: str | None = None,
@@ -36,19 +41,16 @@ class SlackSearch(BasePersonality):
         # bot_id = await self.cslack.openai_history.get_bot_user_id(context=context)
         bot_name = await self.cslack.openai_history.get_bot_name(context=context)
         # if the history is too long, summarize it
-        message_history = self.inference_backend.summarizer.ceil_history(message_history)
+        message_history = await self.inference_backend.summarizer.aceil_history(message_history)
 
-        message_history = [
-            system_message(
-                "I am an expert at using Slack's keyword and phrase search to search Slack for the relevant context to answer your question. I have the capabilities to access and retrieve historic slack messages."
-            ),
-        ] + message_history
+        message_history = [system_message(search_query_system_prompt)] + message_history
 
         search_query_response = await self.inference_backend.async_chat_completion_create(
             messages=message_history,
-            model="gpt-3.5-turbo-0613",  # [gpt-4-32k, gpt-4, gpt-3.5-turbo]
+            route="function_call",
             function_call={"name": "get_search_query"},
             functions=[get_search_query_function],
+            cache=True,
         )
 
         search_query_full_message = search_query_response["choices"][0]
@@ -96,7 +98,7 @@ class SlackSearch(BasePersonality):
 
         logger.debug(f"slack_search_response: {slack_search_response}")
 
-        short_slack_search_response = self.inference_backend.summarizer.ceil_retrieval(slack_search_response)
+        short_slack_search_response = await self.inference_backend.summarizer.aceil_retrieval(slack_search_response)
 
         if slack_search_response != short_slack_search_response:
             logger.debug(f"slack_search_response was shortened: {slack_search_response}")
@@ -105,7 +107,7 @@ class SlackSearch(BasePersonality):
 
         prompt = retrieval_augmented_prompt(q=short_q, slack_search_response=short_slack_search_response)
 
-        message_history.append(user_message(prompt))
+        message_history = message_history + [user_message(prompt)]
 
         response = await self.inference_backend.async_chat_completion_create(
             messages=message_history,
@@ -18,6 +18,8 @@ from cogniq.slack import CogniqSlack, UserTokenNoneError
 from .functions import schedule_future_message_function
 from .task_store import TaskStore
 
+SYSTEM_PROMPT = "I don't make assumptions about what values to plug into functions. I ask for clarification if a user request is ambiguous. I only use the functions that I have been provided with. I only use a function if it makes sense to do so."
+
 
 class TaskManager(BasePersonality):
     def __init__(self, cslack: CogniqSlack, inference_backend: CogniqOpenAI):
@@ -38,6 +40,8 @@ class TaskManager(BasePersonality):
         return "Task Manager"
 
     async def async_setup(self) -> None:
+        await super().async_setup()
+        self.inference_backend.summarizer.precount([SYSTEM_PROMPT])
         await self.task_store.async_setup()
         asyncio.create_task(self.start_task_worker())
 
@@ -63,7 +67,7 @@ class TaskManager(BasePersonality):
         self,
         *,
         q: str,
-        message_history: List[Dict[str, str]],
+        message_history: Sequence[Dict[str, str]],
         context: Dict[str, Any],
         stream_callback: Callable[..., None] | None = None,
         reply_ts: str | None = None,
@@ -72,16 +76,12 @@ class TaskManager(BasePersonality):
         # bot_id = await self.cslack.openai_history.get_bot_user_id(context=context)
         bot_name = await self.cslack.openai_history.get_bot_name(context=context)
         # if the history is too long, summarize it
-        message_history = self.inference_backend.summarizer.ceil_history(message_history)
-        message_history = [
-            system_message(
-                "I don't make assumptions about what values to plug into functions. I ask for clarification if a user request is ambiguous. I only use the functions that I have been provided with. I only use a function if it makes sense to do so."
-            ),
-        ] + message_history
+        message_history = await self.inference_backend.summarizer.aceil_history(message_history)
+        message_history = [system_message(SYSTEM_PROMPT)] + message_history
 
         tasks_response = await self.inference_backend.async_chat_completion_create(
             messages=message_history,
-            model="gpt-4-1106-preview",  # [gpt-4-32k, gpt-4, gpt-3.5-turbo]
+            route="task",
             function_call="auto",
             functions=[schedule_future_message_function()],
         )
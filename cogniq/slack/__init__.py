@@ -1,5 +1,8 @@
 from .cogniq_slack import CogniqSlack
 from .errors import UserTokenNoneError, BotTokenNoneError, TokenNoneError
+from .scheduler import SlackScheduler, slack_priority, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from .stream_publisher import StreamPublisher, StreamBuffer, tail_renderer
+from .stream_writer import SlackStreamWriter
 
 # Not yet implemented
 # from .search import search_results, search_enhanced_prompt
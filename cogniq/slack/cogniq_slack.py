@@ -15,7 +15,6 @@ from tenacity import (
     wait_exponential,
     retry_if_exception_type,
 )
-import asyncio
 
 from slack_bolt.async_app import AsyncApp
 from slack_bolt.oauth.async_oauth_settings import AsyncOAuthSettings
@@ -34,6 +33,7 @@ from cogniq.config import (
     PORT,
     LOG_LEVEL,
     MUTED_LOG_LEVEL,
+    SLACK_API_URL,
     SLACK_CLIENT_ID,
     SLACK_CLIENT_SECRET,
     SLACK_SIGNING_SECRET,
@@ -41,9 +41,14 @@ from cogniq.config import (
 
 from .history.openai_history import OpenAIHistory
 from .history.anthropic_history import AnthropicHistory
+from .history.rolling_history import RollingThreadHistory
+from .message_cache import MessageCache
+from .directory import WorkspaceDirectory
+from .scheduler import ScheduledWebClient, SlackScheduler, PRIORITY_NORMAL, slack_priority
 from .search import Search
 from .state_store import StateStore
 from .installation_store import InstallationStore
+from .thread_summary_store import ThreadSummaryStore
 from .errors import BotTokenNoneError, BotTokenRevokedError, RefreshTokenInvalidError
 
 
@@ -72,10 +77,13 @@ class CogniqSlack:
             scopes=[
                 "app_mentions:read",
                 "channels:history",
+                "channels:read",
                 "chat:write",
                 "groups:history",
+                "groups:read",
                 "im:history",
                 "mpim:history",
+                "users:read",
             ],
             user_scopes=["search:read"],
             installation_store=self.installation_store,
@@ -86,8 +94,11 @@ class CogniqSlack:
 
         app_logger = logging.getLogger(f"{__name__}.slack_bolt")
         app_logger.setLevel(MUTED_LOG_LEVEL)
+        self.scheduler = SlackScheduler()
         self.app = AsyncApp(
             logger=app_logger,
+            # Every call through app.client is paced by the scheduler
+            client=ScheduledWebClient(scheduler=self.scheduler, base_url=SLACK_API_URL, logger=app_logger),
             signing_secret=SLACK_SIGNING_SECRET,
             installation_store=self.installation_store,
             oauth_settings=oauth_settings,
@@ -99,12 +110,27 @@ class CogniqSlack:
         self.app_handler = AsyncSlackRequestHandler(self.app)
         self.api = FastAPI()
 
-        self.anthropic_history = AnthropicHistory(app=self.app)
-        self.openai_history = OpenAIHistory(app=self.app)
+        # Fed by every incoming event; registered as middleware, which runs ahead of the listeners
+        self.message_cache = MessageCache()
+        self.app.use(self.message_cache.middleware)
+        self.directory = WorkspaceDirectory(client=self.app.client)
+        self.app.use(self.directory.middleware)
+        # The directory middleware does the work; these listeners only acknowledge, so that bolt does not answer 404
+        for event_type in ("user_change", "channel_rename", "group_rename"):
+            self.app.event(event_type)(self._acknowledge_event)
+
+        history_kwargs = {"app": self.app, "message_cache": self.message_cache, "directory": self.directory}
+        self.anthropic_history = AnthropicHistory(**history_kwargs)
+        self.openai_history = OpenAIHistory(**history_kwargs)
+        self.thread_summaries = ThreadSummaryStore(engine=self.engine)
+        self.rolling_history = RollingThreadHistory(store=self.thread_summaries, **history_kwargs)
 
         # Set defaults
         self.search = Search(cslack=self)
 
+    async def _acknowledge_event(self) -> None:
+        pass
+
     async def async_setup(self) -> None:
         async with self.engine.begin() as conn:
 
@@ -113,7 +139,7 @@ class CogniqSlack:
                 return inspector.get_table_names()
 
             table_names = await conn.run_sync(get_tables)
-            for table in ["slack_installations", "slack_bots", "slack_oauth_states"]:
+            for table in ["slack_installations", "slack_bots", "slack_oauth_states", "thread_summaries"]:
                 if table not in table_names:
                     raise Exception(f"Table {table} not found in database. Please run migrations with `.venv/bin/alembic upgrade head`.")
 
@@ -172,7 +198,7 @@ class CogniqSlack:
         text: str,
         ts: str,
         context: Dict[str, Any],
-        retry_on_rate_limit: bool = True,
+        priority: int = PRIORITY_NORMAL,
         retry_on_revoked_token: bool = True,
     ) -> AsyncSlackResponse:
         """
@@ -184,7 +210,7 @@ class CogniqSlack:
             ts=ts,
             context=context,
             text=text,
-            retry_on_rate_limit=retry_on_rate_limit,
+            priority=priority,
             retry_on_revoked_token=retry_on_revoked_token,
         )
 
@@ -195,7 +221,7 @@ class CogniqSlack:
         text: str,
         thread_ts: str | None = None,
         context: Dict[str, Any],
-        retry_on_rate_limit: bool = True,
+        priority: int = PRIORITY_NORMAL,
         retry_on_revoked_token: bool = True,
     ) -> AsyncSlackResponse:
         """
@@ -207,7 +233,7 @@ class CogniqSlack:
             text=text,
             thread_ts=thread_ts,
             context=context,
-            retry_on_rate_limit=retry_on_rate_limit,
+            priority=priority,
             retry_on_revoked_token=retry_on_revoked_token,
         )
 
@@ -221,16 +247,37 @@ class CogniqSlack:
         if ts is not None and not isinstance(ts, str):
             raise ValueError(f"ts should be a string or None, but was {type(ts)}: {ts}")
 
+    async def chat_delete(
+        self,
+        *,
+        channel: str,
+        ts: str,
+        context: Dict[str, Any],
+        priority: int = PRIORITY_NORMAL,
+        retry_on_revoked_token: bool = True,
+    ) -> AsyncSlackResponse:
+        """
+        Deletes the chat message at ts in the given channel. The bot can delete only its own messages.
+        """
+        return await self.api_call(
+            method="chat_delete",
+            channel=channel,
+            ts=ts,
+            context=context,
+            priority=priority,
+            retry_on_revoked_token=retry_on_revoked_token,
+        )
+
     async def api_call(
         self,
         *,
         method: str,
         channel: str,
-        text: str,
+        text: str | None = None,
         thread_ts: str | None = None,
         ts: str | None = None,
         context: Dict[str, Any],
-        retry_on_rate_limit: bool = True,
+        priority: int = PRIORITY_NORMAL,
         retry_on_revoked_token: bool = True,
     ) -> AsyncSlackResponse:
         bot_token = context.get("bot_token")
@@ -238,32 +285,19 @@ class CogniqSlack:
 
         try:
             logger.debug(f"Calling {method} at {ts} in thread {thread_ts} in channel {channel}")
-            return await getattr(self.app.client, method)(
-                channel=channel,
-                text=text,
-                thread_ts=thread_ts,
-                ts=ts,
-                token=bot_token,
-            )
+            with slack_priority(priority):
+                # text is left out for methods that take none, e.g. chat.delete
+                return await getattr(self.app.client, method)(
+                    channel=channel,
+                    thread_ts=thread_ts,
+                    ts=ts,
+                    token=bot_token,
+                    **({"text": text} if text is not None else {}),
+                )
         except SlackApiError as e:
             if e.response["error"] == "ratelimited":
-                if retry_on_rate_limit:
-                    # Extract the retry value from the headers
-                    retry_after = int(e.response.headers.get("Retry-After", 1))
-                    # Wait for the requested amount of time before retrying
-                    await asyncio.sleep(retry_after)
-                    return await self.api_call(
-                        method=method,
-                        channel=channel,
-                        text=text,
-                        thread_ts=thread_ts,
-                        ts=ts,
-                        context=context,
-                        retry_on_rate_limit=retry_on_rate_limit,
-                    )
-                else:
-                    # Log the rate limit error and move on
-                    logger.error("Rate limit hit, not retrying: %s", e)
+                # The scheduler has already paused for Retry-After and retried SLACK_RATE_LIMIT_RETRIES times
+                logger.error("Rate limit hit, not retrying: %s", e)
             if e.response["error"] == "invalid_refresh_token":
                 logger.error("Invalid refresh token, not retrying: %s", e)
                 raise RefreshTokenInvalidError(message="Invalid refresh token", context=context)
@@ -280,7 +314,7 @@ class CogniqSlack:
                         thread_ts=thread_ts,
                         ts=ts,
                         context=new_context,
-                        retry_on_rate_limit=retry_on_rate_limit,
+                        priority=priority,
                         retry_on_revoked_token=False,  # Try once, but don't retry again
                     )
                 else:
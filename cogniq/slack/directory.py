@@ -0,0 +1,155 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+
+from cogniq.config import SLACK_DIRECTORY_TTL, SLACK_DIRECTORY_MAX_ENTRIES
+
+from .message_cache import team_key
+
+# <@U123>, <@U123|name>, <#C123> and <#C123|name>
+MENTION_PATTERN = re.compile(r"<([@#])([UWBCGD][A-Z0-9]+)(?:\|([^>]*))?>")
+
+# (team, kind, id); kind is "bot", "user" or "channel"
+EntryKey = Tuple[str, str, str]
+
+
+class WorkspaceDirectory:
+    def __init__(self, *, client: AsyncWebClient, ttl: float = SLACK_DIRECTORY_TTL, max_entries: int = SLACK_DIRECTORY_MAX_ENTRIES):
+        """
+        Per-workspace cache of the bot's name, user display names and channel names.
+
+        Names are looked up on first use and kept for ttl seconds. user_change, channel_rename and group_rename events
+        update them as they happen, and tokens_revoked and app_uninstalled drop the workspace. Concurrent lookups of
+        the same name share one API call. A failed lookup (e.g. a missing users:read scope) is cached as unknown,
+        and the mention is left as Slack sent it.
+
+        client (AsyncWebClient): Slack Web API client.
+        ttl (float): Seconds a name is kept.
+        max_entries (int): Names kept across all workspaces; the least recently used are evicted.
+        """
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[EntryKey, Tuple[asyncio.Future, float]] = OrderedDict()
+
+    async def _lookup(self, key: EntryKey, load: Callable[[], Awaitable[str | None]]) -> str | None:
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self.entries.move_to_end(key)
+            future = entry[0]
+        else:
+            future = asyncio.ensure_future(load())
+            self._set(key, future)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            # Not cached: the next lookup tries again
+            if self.entries.get(key, (None,))[0] is future:
+                del self.entries[key]
+            raise
+
+    def _set(self, key: EntryKey, future: asyncio.Future) -> None:
+        self.entries[key] = (future, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _put(self, key: EntryKey, name: str | None) -> None:
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(name)
+        self._set(key, future)
+
+    async def bot_name(self, *, context: Dict[str, Any]) -> str:
+        async def load() -> str:
+            auth_test = await self.client.auth_test(token=context["bot_token"])
+            return auth_test["user"]
+
+        return await self._lookup((team_key(context), "bot", context.get("bot_user_id") or ""), load)
+
+    async def user_name(self, user_id: str, *, context: Dict[str, Any]) -> str | None:
+        async def load() -> str | None:
+            try:
+                response = await self.client.users_info(token=context["bot_token"], user=user_id)
+            except SlackApiError as e:
+                logger.warning(f"Could not look up user {user_id}: {e.response['error']}")
+                return None
+            return self._user_name(response["user"])
+
+        return await self._lookup((team_key(context), "user", user_id), load)
+
+    async def channel_name(self, channel_id: str, *, context: Dict[str, Any]) -> str | None:
+        async def load() -> str | None:
+            try:
+                response = await self.client.conversations_info(token=context["bot_token"], channel=channel_id)
+            except SlackApiError as e:
+                logger.warning(f"Could not look up channel {channel_id}: {e.response['error']}")
+                return None
+            return response["channel"].get("name")
+
+        return await self._lookup((team_key(context), "channel", channel_id), load)
+
+    def _user_name(self, user: Dict[str, Any]) -> str | None:
+        profile = user.get("profile") or {}
+        return profile.get("display_name") or profile.get("real_name") or user.get("real_name") or user.get("name")
+
+    async def resolve_mentions(self, text: str | None, *, context: Dict[str, Any]) -> str | None:
+        """
+        Replaces the user and channel mentions in text with @name and #name, looking up the names not given inline.
+        """
+        if not text or "<" not in text:
+            return text
+        mentions = MENTION_PATTERN.findall(text)
+        lookups = {(sigil, object_id) for sigil, object_id, label in mentions if not label}
+        names = dict(
+            zip(
+                lookups,
+                await asyncio.gather(
+                    *(
+                        self.user_name(object_id, context=context) if sigil == "@" else self.channel_name(object_id, context=context)
+                        for sigil, object_id in lookups
+                    )
+                ),
+            )
+        )
+
+        def replace(match: re.Match) -> str:
+            sigil, object_id, label = match.groups()
+            name = label or names.get((sigil, object_id))
+            return f"{sigil}{name}" if name else match.group(0)
+
+        return MENTION_PATTERN.sub(replace, text)
+
+    def apply_event(self, *, team_id: str, event: Dict[str, Any]) -> None:
+        event_type = event.get("type")
+        if event_type == "user_change":
+            user = event["user"]
+            self._put((team_id, "user", user["id"]), self._user_name(user))
+        elif event_type in ("channel_rename", "group_rename"):
+            channel = event["channel"]
+            self._put((team_id, "channel", channel["id"]), channel.get("name"))
+        elif event_type in ("tokens_revoked", "app_uninstalled"):
+            for key in [key for key in self.entries if key[0] == team_id]:
+                del self.entries[key]
+
+    async def middleware(self, body: Dict[str, Any], context: Dict[str, Any], next: Callable[[], Awaitable[None]]) -> None:
+        """
+        Global bolt middleware that keeps the directory current from workspace events.
+        """
+        event = body.get("event")
+        if isinstance(event, dict):
+            try:
+                self.apply_event(team_id=team_key(context), event=event)
+            except Exception as e:
+                logger.warning(f"Could not apply {event.get('type')} event to the workspace directory: {e}")
+        await next()
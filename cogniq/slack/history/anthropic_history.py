@@ -10,6 +10,8 @@ from cogniq.openai import system_message, user_message, assistant_message
 
 
 class AnthropicHistory(OpenAIHistory):
+    history_format = "anthropic"
+
     def _convert_to_chat_sequence(self, *, messages, bot_user_id):
         chat_sequence = ""
         for message in messages:
@@ -23,5 +23,5 @@ class BaseHistory(metaclass=abc.ABCMeta):
         pass
 
     @abc.abstractmethod
-    async def get_history(self, *, event: Dict[str, str], context: Dict[str, Any]) -> List[Dict[str, str]]:
+    async def get_history(self, *, event: Dict[str, str], context: Dict[str, Any]) -> Sequence[Dict[str, str]]:
         pass
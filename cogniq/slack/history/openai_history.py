@@ -6,48 +6,72 @@ import logging
 logger = logging.getLogger(__name__)
 
 import asyncio
+import contextlib
 
 from slack_bolt.async_app import AsyncApp
 from slack_sdk.errors import SlackApiError
 
-from cogniq.openai import user_message, system_message, assistant_message
+from cogniq.config import SLACK_HISTORY_PAGE_SIZE, SLACK_REPLIES_PAGE_SIZE, SLACK_REPLIES_CONCURRENCY
+from cogniq.openai import user_message, system_message, assistant_message, Conversation
 
 from .base_history import BaseHistory
+from .request_history import request_history
+from ..directory import WorkspaceDirectory
+from ..message_cache import MessageCache, filter_message, team_key
 
 
 class OpenAIHistory(BaseHistory):
-    def __init__(self, app: AsyncApp):
+    # Names the format _convert_to_chat_sequence produces, for memoizing it per request
+    history_format = "openai"
+
+    def __init__(self, app: AsyncApp, message_cache: MessageCache | None = None, directory: WorkspaceDirectory | None = None):
         """
         History is intended as a subclass of CogniqSlack when interoperating with OpenAI.
         It is responsible for storing and retrieving slack history formatted for OpenAI's consumption.
 
         Parameters:
         app (slack_bolt.async_app.AsyncApp): Instance of Slack's AsyncApp.
+        message_cache (MessageCache): Serves history without API calls when it holds the messages. Optional.
+        directory (WorkspaceDirectory): Resolves the bot name and the user and channel mentions. Optional.
 
         logger (logging.Logger): Logger to log information about the history object.
         """
         self.app = app
+        self.message_cache = message_cache
+        self.directory = directory
+        # Bounds the conversations.replies calls in flight across all requests served by this history
+        self.replies_semaphore = asyncio.Semaphore(SLACK_REPLIES_CONCURRENCY)
 
     async def get_bot_user_id(self, *, context: Dict[str, Any]) -> str:
         return context["bot_user_id"]
 
     async def get_bot_name(self, *, context: Dict[str, Any]) -> str:
-        auth_test = await self.app.client.auth_test(token=context["bot_token"])
-        return auth_test["user"]
+        if self.directory is not None:
+            return await self.directory.bot_name(context=context)
+
+        async def load() -> str:
+            auth_test = await self.app.client.auth_test(token=context["bot_token"])
+            return auth_test["user"]
+
+        return await request_history(context).memoize(("bot_name",), load)
 
-    async def get_history(self, *, event: Dict[str, str], context: Dict[str, Any]) -> List[Dict[str, str]]:
+    async def get_history(self, *, event: Dict[str, str], context: Dict[str, Any]) -> Conversation:
         channel_id = event["channel"]
         thread_ts = event.get("thread_ts")
 
-        response = await self._get_conversations_and_convert_to_chat_sequence(channel_id=channel_id, thread_ts=thread_ts, context=context)
+        response = await request_history(context).memoize(
+            ("history", self.history_format, channel_id, thread_ts),
+            lambda: self._get_conversations_and_convert_to_chat_sequence(channel_id=channel_id, thread_ts=thread_ts, context=context),
+        )
 
         logger.debug(f"get_history: {response}")
         return response
 
     async def _get_conversations_and_convert_to_chat_sequence(
         self, *, channel_id: str, thread_ts=None, context: Dict[str, Any]
-    ) -> List[Dict[str, str]]:
+    ) -> Conversation:
         messages = await self._get_conversations(channel_id=channel_id, thread_ts=thread_ts, context=context)
+        messages = await self.resolve_mentions(messages=messages, context=context)
 
         bot_user_id = await self.get_bot_user_id(context=context)
 
@@ -58,11 +82,107 @@ class OpenAIHistory(BaseHistory):
 
         return self._convert_to_chat_sequence(messages=messages, bot_user_id=bot_user_id)
 
-    async def _get_conversations(self, *, channel_id: str, thread_ts=None, context: Dict[str, Any]) -> List[Dict[str, str]]:
+    async def get_thread_messages(
+        self, *, channel_id: str, thread_ts: str, context: Dict[str, Any], oldest: str | None = None
+    ) -> List[Dict[str, str]]:
+        """
+        Returns every message of a thread newer than oldest, oldest first.
+        """
+        messages, _ = await self.get_thread_page(
+            channel_id=channel_id, thread_ts=thread_ts, context=context, oldest=oldest, max_messages=None
+        )
+        return messages
+
+    async def get_thread_page(
+        self, *, channel_id: str, thread_ts: str, context: Dict[str, Any], oldest: str | None, max_messages: int | None
+    ) -> Tuple[List[Dict[str, str]], bool]:
+        """
+        Returns the messages of a thread newer than oldest, oldest first, reading at most about max_messages,
+        and whether more may follow the last of them.
+        """
+        messages = await self._get_conversations(
+            channel_id=channel_id, thread_ts=thread_ts, context=context, oldest=oldest, max_messages=max_messages
+        )
+        # The read stops once it holds max_messages, so a shorter read reached the end of the thread
+        more = max_messages is not None and len(messages) >= max_messages
+        if oldest is not None:
+            # Slack includes the parent message, and the message at oldest itself
+            messages = [message for message in messages if float(message["ts"]) > float(oldest)]
+        return messages, more
+
+    async def _get_conversations(
+        self,
+        *,
+        channel_id: str,
+        thread_ts=None,
+        context: Dict[str, Any],
+        oldest: str | None = None,
+        max_messages: int | None = 20,
+        semaphore: asyncio.Semaphore | None = None,
+    ) -> List[Dict[str, str]]:
+        """
+        Loads the messages once per request. See _load_conversations.
+        """
+        return await request_history(context).memoize(
+            ("conversations", channel_id, thread_ts, oldest, max_messages),
+            lambda: self._load_conversations(
+                channel_id=channel_id, thread_ts=thread_ts, context=context, oldest=oldest, max_messages=max_messages, semaphore=semaphore
+            ),
+        )
+
+    async def _load_conversations(
+        self,
+        *,
+        channel_id: str,
+        thread_ts: str | None,
+        context: Dict[str, Any],
+        oldest: str | None,
+        max_messages: int | None,
+        semaphore: asyncio.Semaphore | None,
+    ) -> List[Dict[str, str]]:
+        """
+        Serves the messages from the message cache when it holds them, and otherwise fetches them from the API,
+        under semaphore if one is given.
+        """
+        messages = self._get_cached_conversations(channel_id=channel_id, thread_ts=thread_ts, context=context, oldest=oldest, max_messages=max_messages)
+        if messages is None:
+            async with semaphore or contextlib.nullcontext():
+                messages = await self._fetch_conversations(
+                    channel_id=channel_id, thread_ts=thread_ts, context=context, oldest=oldest, max_messages=max_messages
+                )
+
+        if thread_ts is None:
+            # If there are threads in the conversation history, fetch them concurrently.
+            threaded_messages = [message for message in messages if message.get("thread_ts") is not None]
+            replies = await asyncio.gather(
+                *(
+                    self._get_conversations(channel_id=channel_id, thread_ts=message["thread_ts"], context=context, semaphore=self.replies_semaphore)
+                    for message in threaded_messages
+                )
+            )
+            for message, message_replies in zip(threaded_messages, replies):
+                message["replies"] = message_replies
+        return messages
+
+    def _get_cached_conversations(
+        self, *, channel_id: str, thread_ts: str | None, context: Dict[str, Any], oldest: str | None, max_messages: int | None
+    ) -> List[Dict[str, str]] | None:
+        if self.message_cache is None:
+            return None
+        if thread_ts is None:
+            if oldest is not None or max_messages is None:
+                return None
+            return self.message_cache.channel(team_id=team_key(context), channel_id=channel_id, max_messages=max_messages)
+        return self.message_cache.thread(
+            team_id=team_key(context), channel_id=channel_id, thread_ts=thread_ts, oldest=oldest, max_messages=max_messages
+        )
+
+    async def _fetch_conversations(
+        self, *, channel_id: str, thread_ts: str | None, context: Dict[str, Any], oldest: str | None, max_messages: int | None
+    ) -> List[Dict[str, str]]:
         messages: List[Dict[str, str]] = []
         cursor = None
-        messages_per_page = 20
-        max_messages = 20
+        messages_per_page = SLACK_HISTORY_PAGE_SIZE if thread_ts is None else SLACK_REPLIES_PAGE_SIZE
 
         while True:
             try:
@@ -82,47 +202,50 @@ class OpenAIHistory(BaseHistory):
                         limit=messages_per_page,
                         ts=thread_ts,
                         cursor=cursor,
+                        oldest=oldest,
                     )
             except SlackApiError as e:
-                if e.response["error"] == "ratelimited":
-                    retry_after = int(e.response.headers.get("Retry-After", 1))
-                    # logger.info(f"history fetched thus far: {messages}")
-                    # logger.info(f"Response: {e.response}")
-                    logger.warning(f"Rate limit hit. Retrying after {retry_after} seconds.")
-                    await asyncio.sleep(retry_after)
-                    continue
-                else:
-                    logger.error(f"Error fetching conversations due to Slack API Error: {e}")
-                    return messages
+                # Rate limits included: the scheduler has already paused and retried
+                logger.error(f"Error fetching conversations due to Slack API Error: {e}")
+                return messages
 
             # logger.info("History Response: %s", response)
-            for message in response["messages"]:
-                filtered_message = self._filter_message(message)
-                # If there is a thread in the conversation history, fetch the thread.
-                if thread_ts is None and filtered_message.get("thread_ts") is not None:
-                    replies_response = await self._get_conversations(
-                        channel_id=channel_id,
-                        thread_ts=filtered_message.get("thread_ts"),
-                        context=context,
-                    )
-                    filtered_message["replies"] = replies_response
-                messages.append(filtered_message)
+            messages.extend(self._filter_message(message) for message in response["messages"])
 
             if not response["has_more"]:
                 break
-            if len(messages) >= max_messages:
+            if max_messages is not None and len(messages) >= max_messages:
                 break
             logger.info(f"fetching next cursor: {response['response_metadata']['next_cursor']}")
             cursor = response["response_metadata"]["next_cursor"]
+
+        if self.message_cache is not None:
+            complete = not response["has_more"]
+            if thread_ts is None:
+                self.message_cache.backfill_channel(team_id=team_key(context), channel_id=channel_id, messages=messages, complete=complete)
+            else:
+                self.message_cache.backfill_thread(
+                    team_id=team_key(context), channel_id=channel_id, thread_ts=thread_ts, messages=messages, oldest=oldest, complete=complete
+                )
         return messages
 
+    async def resolve_mentions(self, *, messages: List[Dict[str, Any]], context: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Copies of the messages and their replies, with <@U…> and <#C…> mentions replaced by names the model can read.
+        """
+        if self.directory is None:
+            return messages
+
+        async def resolve(message: Dict[str, Any]) -> Dict[str, Any]:
+            resolved = {**message, "text": await self.directory.resolve_mentions(message.get("text"), context=context)}
+            if message.get("replies"):
+                resolved["replies"] = await self.resolve_mentions(messages=message["replies"], context=context)
+            return resolved
+
+        return list(await asyncio.gather(*(resolve(message) for message in messages)))
+
     def _filter_message(self, message):
-        return {
-            "ts": message.get("ts"),
-            "user": message.get("user"),
-            "text": message.get("text"),
-            "thread_ts": message.get("thread_ts"),
-        }
+        return filter_message(message)
 
     def _convert_to_chat_sequence(self, *, messages, bot_user_id):
         chat_sequence = []
@@ -137,4 +260,4 @@ class OpenAIHistory(BaseHistory):
                         chat_sequence.append(assistant_message(reply.get("text")))
                     else:
                         chat_sequence.append(user_message(reply.get("text")))
-        return chat_sequence
+        return Conversation(chat_sequence)
@@ -0,0 +1,47 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import asyncio
+
+T = TypeVar("T")
+
+CONTEXT_KEY = "request_history"
+
+
+class RequestHistory:
+    def __init__(self):
+        """
+        The history lookups of one Slack request, memoized for the length of the request.
+
+        A dispatch hands the same event to several personalities, and each asks for its history.
+        The raw Slack messages are fetched once per request, and each format (OpenAI messages, Anthropic prompt,
+        rolling summary) is derived from them once, when first asked for. Concurrent lookups of the same key
+        share one fetch.
+        """
+        self._results: Dict[Hashable, asyncio.Future] = {}
+
+    async def memoize(self, key: Hashable, load: Callable[[], Awaitable[T]]) -> T:
+        """
+        Returns the result of load(), calling it only for the first lookup of key in this request.
+        A failed load fails every lookup of key.
+        """
+        future = self._results.get(key)
+        if future is None:
+            future = self._results[key] = asyncio.ensure_future(load())
+        # A cancelled lookup must not cancel the load that other lookups are waiting on
+        return await asyncio.shield(future)
+
+
+def request_history(context: Dict[str, Any]) -> RequestHistory:
+    """
+    The RequestHistory of the request that context belongs to, created on first use.
+    Bolt creates one context per incoming request, and it travels with the request to every personality.
+    """
+    history = context.get(CONTEXT_KEY)
+    if history is None:
+        history = context[CONTEXT_KEY] = RequestHistory()
+    return history
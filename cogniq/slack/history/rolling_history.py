@@ -0,0 +1,140 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+from slack_bolt.async_app import AsyncApp
+
+import asyncio
+
+from cogniq.config import OPENAI_MAX_TOKENS_HISTORY, OPENAI_THREAD_SUMMARY_MAX_TOKENS, OPENAI_THREAD_FOLD_MESSAGES
+from cogniq.openai import system_message, Conversation
+from cogniq.openai.summarizer import Summarizer
+
+from .openai_history import OpenAIHistory
+from .request_history import request_history
+from ..directory import WorkspaceDirectory
+from ..message_cache import MessageCache, team_key
+from ..thread_summary_store import ThreadSummary, ThreadSummaryStore
+
+
+class RollingThreadHistory(OpenAIHistory):
+    def __init__(
+        self,
+        *,
+        app: AsyncApp,
+        store: ThreadSummaryStore,
+        message_cache: MessageCache | None = None,
+        directory: WorkspaceDirectory | None = None,
+    ):
+        """
+        Thread history as a rolling summary plus the most recent messages.
+
+        The messages of a thread that no longer fit the history budget are folded into a persisted summary,
+        and the summary's watermark moves past them. Later turns fetch only the messages after the watermark,
+        so each turn costs Slack API calls and tokens in proportion to the messages since the last fold,
+        rather than to the length of the thread. The thread is read OPENAI_THREAD_FOLD_MESSAGES messages at a time,
+        and everything older than the tail that fits is folded in one summarization.
+        """
+        super().__init__(app=app, message_cache=message_cache, directory=directory)
+        self.store = store
+
+    async def get_history(
+        self,
+        *,
+        event: Dict[str, str],
+        context: Dict[str, Any],
+        summarizer: Summarizer | None = None,
+        max_tokens: int | None = None,
+    ) -> Conversation:
+        """
+        summarizer: Counts tokens and summarizes. Without one, the plain history is returned.
+        max_tokens: Budget for the summary and the tail together. Defaults to OPENAI_MAX_TOKENS_HISTORY.
+        """
+        thread_ts = event.get("thread_ts")
+        if summarizer is None or thread_ts is None:
+            return await super().get_history(event=event, context=context)
+        if max_tokens is None:
+            max_tokens = int(OPENAI_MAX_TOKENS_HISTORY)
+
+        # Personalities answering the same request share one fold, rather than each summarizing the thread
+        return await request_history(context).memoize(
+            ("rolling", event["channel"], thread_ts, summarizer.encoding.name, max_tokens),
+            lambda: self._get_rolling_history(event=event, context=context, summarizer=summarizer, max_tokens=max_tokens),
+        )
+
+    async def _get_rolling_history(
+        self, *, event: Dict[str, str], context: Dict[str, Any], summarizer: Summarizer, max_tokens: int
+    ) -> Conversation:
+        thread_ts = event["thread_ts"]
+        key = {"team_id": team_key(context), "channel_id": event["channel"], "thread_ts": thread_ts}
+        stored = await self.store.get(**key)
+        bot_user_id = await self.get_bot_user_id(context=context)
+        summary_budget = min(OPENAI_THREAD_SUMMARY_MAX_TOKENS, max_tokens // 2)
+
+        messages: List[Dict[str, str]] = []
+        oldest = stored.watermark_ts if stored else None
+        more = True
+        while more:
+            page, more = await self.get_thread_page(
+                channel_id=event["channel"], thread_ts=thread_ts, context=context, oldest=oldest, max_messages=OPENAI_THREAD_FOLD_MESSAGES
+            )
+            if not page:
+                break
+            messages += page
+            oldest = page[-1]["ts"]
+
+        messages = await self.resolve_mentions(messages=messages, context=context)
+        tail = self._convert_to_chat_sequence(messages=messages, bot_user_id=bot_user_id)
+
+        summary_tokens = await summarizer.acount_tokens(stored.summary) if stored else 0
+        if summary_tokens + await summarizer.acount_tokens(tail) > max_tokens:
+            # Fold the oldest messages into the summary, keeping as long a tail as fits next to it
+            kept = await summarizer.aceil_history(tail, max_tokens - summary_budget)
+            folded = len(tail) - len(kept)
+            if folded:
+                stored = await self._fold(
+                    summarizer=summarizer,
+                    stored=stored,
+                    messages=messages[:folded],
+                    max_tokens=summary_budget,
+                    context=context,
+                    bot_user_id=bot_user_id,
+                )
+                await self.store.save(**key, summary=stored)
+                tail = kept
+                logger.info(f"Folded {folded} messages of thread {thread_ts} into its summary, keeping {len(tail)}")
+
+        if stored is None:
+            return tail
+        return [system_message(f"Summary of the earlier conversation: {stored.summary}")] + tail
+
+    async def _fold(
+        self,
+        *,
+        summarizer: Summarizer,
+        stored: ThreadSummary | None,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        context: Dict[str, Any],
+        bot_user_id: str,
+    ) -> ThreadSummary:
+        speakers = await self._speakers(messages=messages, context=context, bot_user_id=bot_user_id)
+        transcript = "\n".join(f"{speakers[message.get('user')]}: {message.get('text')}" for message in messages)
+        content = f"Summary so far: {stored.summary}\n\nNew messages:\n{transcript}" if stored else transcript
+        summary = await summarizer.summarize_content(content, max_tokens)
+        return ThreadSummary(summary=summary, watermark_ts=messages[-1]["ts"])
+
+    async def _speakers(self, *, messages: List[Dict[str, str]], context: Dict[str, Any], bot_user_id: str) -> Dict[str | None, str]:
+        """
+        Labels the speakers of messages for a transcript: "Assistant" for the bot, and the other users by name where the
+        directory knows it, so that the persisted summary does not refer to raw user IDs.
+        """
+        users = {message.get("user") for message in messages} - {bot_user_id}
+        known = [user for user in users if user]
+        names: Dict[str | None, str | None] = {}
+        if self.directory is not None:
+            names = dict(zip(known, await asyncio.gather(*(self.directory.user_name(user, context=context) for user in known))))
+        return {bot_user_id: "Assistant", **{user: names.get(user) or f"<@{user}>" for user in users}}
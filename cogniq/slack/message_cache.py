@@ -0,0 +1,234 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import time
+from collections import OrderedDict
+
+from cogniq.config import SLACK_MESSAGE_CACHE_MAX_THREADS, SLACK_MESSAGE_CACHE_MAX_MESSAGES, SLACK_MESSAGE_CACHE_TTL
+
+# (team, channel, thread_ts); thread_ts None is the channel's top-level messages
+WindowKey = Tuple[str, str, Optional[str]]
+
+# Message subtypes that do not add a message
+IGNORED_SUBTYPES = {"message_replied", "message_changed", "message_deleted"}
+
+
+def filter_message(message: Dict[str, Any]) -> Dict[str, str]:
+    """
+    The fields of a Slack message that history reconstruction uses.
+    """
+    return {
+        "ts": message.get("ts"),
+        "user": message.get("user"),
+        "text": message.get("text"),
+        "thread_ts": message.get("thread_ts"),
+    }
+
+
+def team_key(context: Dict[str, Any]) -> str:
+    return context.get("team_id") or context.get("enterprise_id") or ""
+
+
+class _Window:
+    __slots__ = ("messages", "covers_from", "filled_at")
+
+    def __init__(self, messages: Iterable[Dict[str, str]], covers_from: str | None):
+        # ts -> message, oldest first
+        self.messages: Dict[str, Dict[str, str]] = {message["ts"]: message for message in sorted(messages, key=lambda m: float(m["ts"]))}
+        # Every message from covers_from on is held; None means every message since the beginning
+        self.covers_from = covers_from
+        self.filled_at = time.monotonic()
+
+    def put(self, message: Dict[str, str]) -> None:
+        ts = message["ts"]
+        if ts in self.messages or not self.messages or float(ts) > float(next(reversed(self.messages))):
+            self.messages[ts] = message
+        else:
+            # Out of order, which is rare: events arrive roughly in ts order
+            self.messages = {m["ts"]: m for m in sorted([*self.messages.values(), message], key=lambda m: float(m["ts"]))}
+
+    def trim(self, max_messages: int) -> None:
+        while len(self.messages) > max_messages:
+            del self.messages[next(iter(self.messages))]
+            self.covers_from = next(iter(self.messages))
+
+    def covers(self, oldest: str | None) -> bool:
+        return self.covers_from is None or (oldest is not None and float(oldest) >= float(self.covers_from))
+
+
+class MessageCache:
+    def __init__(
+        self,
+        *,
+        max_windows: int = SLACK_MESSAGE_CACHE_MAX_THREADS,
+        max_messages: int = SLACK_MESSAGE_CACHE_MAX_MESSAGES,
+        ttl: float = SLACK_MESSAGE_CACHE_TTL,
+    ):
+        """
+        In-memory cache of recent Slack messages, per thread and per channel, for reconstructing history
+        without conversations.history and conversations.replies calls, which are Tier 3 rate limited.
+
+        A window (the messages of a thread, or the top-level messages of a channel) becomes usable once it is
+        backfilled from the API, or when its first message arrives as an event. From then on, message, edit and
+        delete events keep it current, and it serves reads for as long as it holds the requested range.
+        Windows are evicted least recently used, trimmed to their newest max_messages, and expire after ttl
+        seconds so that a missed event is eventually corrected by a fresh backfill.
+
+        max_windows (int): Threads and channels held.
+        max_messages (int): Messages held per thread or channel.
+        ttl (float): Seconds a window serves reads after it was backfilled.
+        """
+        self.max_windows = max_windows
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.windows: OrderedDict[WindowKey, _Window] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: WindowKey) -> _Window | None:
+        window = self.windows.get(key)
+        if window is None:
+            return None
+        if time.monotonic() - window.filled_at > self.ttl:
+            del self.windows[key]
+            return None
+        self.windows.move_to_end(key)
+        return window
+
+    def _set(self, key: WindowKey, window: _Window) -> None:
+        window.trim(self.max_messages)
+        self.windows[key] = window
+        self.windows.move_to_end(key)
+        while len(self.windows) > self.max_windows:
+            self.windows.popitem(last=False)
+
+    def _count(self, messages: List[Dict[str, str]] | None) -> List[Dict[str, str]] | None:
+        if messages is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return messages
+
+    def thread(
+        self, *, team_id: str, channel_id: str, thread_ts: str, oldest: str | None = None, max_messages: int | None = None
+    ) -> List[Dict[str, str]] | None:
+        """
+        The messages of a thread, oldest first, as conversations.replies returns them; None when not held.
+        With oldest, only the messages from oldest on. With max_messages, only the first max_messages of those,
+        as a fetch that stops after max_messages would return.
+        """
+        window = self._get((team_id, channel_id, thread_ts))
+        if window is None or not window.covers(oldest):
+            return self._count(None)
+        messages = [dict(message) for message in window.messages.values() if oldest is None or float(message["ts"]) >= float(oldest)]
+        return self._count(messages[:max_messages] if max_messages is not None else messages)
+
+    def channel(self, *, team_id: str, channel_id: str, max_messages: int) -> List[Dict[str, str]] | None:
+        """
+        The newest max_messages top-level messages of a channel, newest first, as conversations.history returns them;
+        None when not held.
+        """
+        window = self._get((team_id, channel_id, None))
+        if window is None or (window.covers_from is not None and len(window.messages) < max_messages):
+            return self._count(None)
+        return self._count([dict(message) for message in reversed(window.messages.values())][:max_messages])
+
+    def backfill_thread(
+        self, *, team_id: str, channel_id: str, thread_ts: str, messages: List[Dict[str, str]], oldest: str | None, complete: bool
+    ) -> None:
+        """
+        Stores a thread fetched from the API. complete: Whether every message from oldest on was fetched.
+        """
+        if complete:
+            self._backfill((team_id, channel_id, thread_ts), messages, covers_from=oldest)
+
+    def backfill_channel(self, *, team_id: str, channel_id: str, messages: List[Dict[str, str]], complete: bool) -> None:
+        """
+        Stores the newest top-level messages of a channel fetched from the API, newest first.
+        complete: Whether the fetch reached the beginning of the channel.
+        """
+        if messages:
+            self._backfill((team_id, channel_id, None), messages, covers_from=None if complete else messages[-1]["ts"])
+
+    def _backfill(self, key: WindowKey, messages: List[Dict[str, str]], *, covers_from: str | None) -> None:
+        window = _Window([{k: v for k, v in message.items() if k != "replies"} for message in messages], covers_from)
+        previous = self.windows.get(key)
+        if previous is not None and window.messages:
+            # Keep the messages that arrived as events while the API call was in flight
+            newest = float(next(reversed(window.messages)))
+            for ts, message in previous.messages.items():
+                if float(ts) > newest:
+                    window.put(message)
+        self._set(key, window)
+
+    def apply_event(self, *, team_id: str, event: Dict[str, Any]) -> None:
+        """
+        Applies a message, message_changed, message_deleted or app_mention event to the windows that hold it.
+        """
+        channel_id = event.get("channel")
+        if channel_id is None or event.get("type") not in ("message", "app_mention"):
+            return
+        subtype = event.get("subtype")
+        if subtype == "message_changed":
+            self._edit(team_id, channel_id, filter_message(event["message"]))
+        elif subtype == "message_deleted":
+            self._delete(team_id, channel_id, event["deleted_ts"], (event.get("previous_message") or {}).get("thread_ts"))
+        elif subtype not in IGNORED_SUBTYPES and event.get("ts") is not None:
+            self._add(team_id, channel_id, filter_message(event))
+
+    def _add(self, team_id: str, channel_id: str, message: Dict[str, str]) -> None:
+        ts, thread_ts = message["ts"], message.get("thread_ts")
+        channel = self._get((team_id, channel_id, None))
+        if thread_ts is None or thread_ts == ts:
+            # A new top-level message: its thread is known to be just this message
+            if channel is not None:
+                channel.put(message)
+                channel.trim(self.max_messages)
+            if (team_id, channel_id, ts) not in self.windows:
+                self._set((team_id, channel_id, ts), _Window([dict(message)], covers_from=None))
+            return
+        thread = self._get((team_id, channel_id, thread_ts))
+        if thread is not None:
+            thread.put(message)
+            thread.trim(self.max_messages)
+            if thread_ts in thread.messages:
+                thread.messages[thread_ts]["thread_ts"] = thread_ts
+        if channel is not None and thread_ts in channel.messages:
+            # The parent now has a thread, as conversations.history would report
+            channel.messages[thread_ts]["thread_ts"] = thread_ts
+
+    def _edit(self, team_id: str, channel_id: str, message: Dict[str, str]) -> None:
+        ts = message["ts"]
+        for key in ((team_id, channel_id, message.get("thread_ts") or ts), (team_id, channel_id, None)):
+            window = self.windows.get(key)
+            if window is not None and ts in window.messages:
+                window.messages[ts] = {**message, "thread_ts": message.get("thread_ts") or window.messages[ts].get("thread_ts")}
+
+    def _delete(self, team_id: str, channel_id: str, ts: str, thread_ts: str | None) -> None:
+        if thread_ts is None or thread_ts == ts:
+            # The parent of a thread; Slack may leave a tombstone in its place, so refetch the thread when next needed
+            self.windows.pop((team_id, channel_id, ts), None)
+        else:
+            thread = self.windows.get((team_id, channel_id, thread_ts))
+            if thread is not None:
+                thread.messages.pop(ts, None)
+        channel = self.windows.get((team_id, channel_id, None))
+        if channel is not None:
+            channel.messages.pop(ts, None)
+
+    async def middleware(self, body: Dict[str, Any], context: Dict[str, Any], next: Callable[[], Awaitable[None]]) -> None:
+        """
+        Global bolt middleware that feeds every incoming event to the cache.
+        Registered with app.use, because bolt runs only the first listener that matches an event.
+        """
+        event = body.get("event")
+        if isinstance(event, dict):
+            try:
+                self.apply_event(team_id=team_key(context), event=event)
+            except Exception as e:
+                logger.warning(f"Could not apply {event.get('type')} event to the message cache: {e}")
+        await next()
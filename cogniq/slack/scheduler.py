@@ -0,0 +1,313 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+from slack_sdk.web.async_slack_response import AsyncSlackResponse
+
+from cogniq.config import SLACK_TIER_RATES, SLACK_METHOD_TIERS, SLACK_CHANNEL_MESSAGES_PER_SECOND, SLACK_RATE_LIMIT_RETRIES
+from cogniq.openai.rate_limiter import TokenBucket
+
+# Lower is sooner
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2  # e.g. intermediate updates of a streamed answer
+
+# Rate limit tiers of the methods CogniQ calls, per https://api.slack.com/docs/rate-limits. Other methods are Tier 3.
+# chat.postMessage is "special": several hundred per minute per workspace, and one per second per channel.
+METHOD_TIERS = {
+    "auth.test": 4,
+    "bots.info": 3,
+    "chat.postMessage": 4,
+    "chat.update": 3,
+    "conversations.history": 3,
+    "conversations.info": 3,
+    "conversations.list": 2,
+    "conversations.replies": 3,
+    "search.messages": 2,
+    "users.info": 4,
+    "users.list": 2,
+    **SLACK_METHOD_TIERS,
+}
+# Methods that also count against the per-channel message limit
+CHANNEL_METHODS = {"chat.postMessage", "chat.update"}
+# Methods called without a workspace token, which Slack does not rate limit per workspace
+UNLIMITED_METHODS = {"oauth.v2.access", "oauth.access", "openid.connect.token"}
+# Superseded-update bookkeeping kept per lane: the messages most recently updated
+SUPERSEDE_HISTORY = 256
+# Seconds between sweeps of the buckets that are full again, which hold no state worth keeping
+BUCKET_SWEEP_INTERVAL = 60.0
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("slack_priority", default=PRIORITY_NORMAL)
+
+
+@contextlib.contextmanager
+def slack_priority(priority: int) -> Iterator[None]:
+    """
+    Sets the priority of the Slack API calls made within the block.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "key", "buckets", "released", "done")
+
+    def __init__(self, *, priority: int, seq: int, key: Hashable | None, buckets: List[TokenBucket]):
+        self.priority = priority
+        self.seq = seq
+        # A token from each of these is needed to send the call
+        self.buckets = buckets
+        # Calls with the same key overwrite each other; only the newest one needs to be sent
+        self.key = key
+        # Resolves to None when the call may be sent, or to the newer _Waiter that superseded it
+        self.released: asyncio.Future = asyncio.get_running_loop().create_future()
+        # The response of the call
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: _Waiter) -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _Lane:
+    def __init__(self):
+        """
+        The calls competing for the same buckets, released in priority order as their buckets allow.
+        """
+        self.queue: List[_Waiter] = []
+        self.latest: OrderedDict[Hashable, _Waiter] = OrderedDict()
+        self.pump: asyncio.Task | None = None
+
+
+class SlackScheduler:
+    def __init__(
+        self,
+        *,
+        tier_rates: Dict[str, float] = SLACK_TIER_RATES,
+        channel_rate: float = SLACK_CHANNEL_MESSAGES_PER_SECOND,
+        max_retries: int = SLACK_RATE_LIMIT_RETRIES,
+    ):
+        """
+        Paces Slack Web API calls to stay within Slack's rate limits, rather than discovering them through `ratelimited` errors.
+
+        Slack limits each method per workspace according to its tier, and messages to one per second per channel.
+        Every call waits in a lane for a token from its (workspace, method) bucket and, for chat.postMessage and
+        chat.update, from its channel's bucket. Calls of one method share a lane, except that the messages of a
+        channel, posts and updates alike, share the channel's lane. Within a lane, calls go out in priority order
+        (see slack_priority), so an intermediate update never takes the channel's turn from a new message.
+        A chat.update still waiting when a newer update of the same message arrives is dropped, and its caller gets
+        the newer update's response. When Slack does answer `ratelimited`, the lane pauses for Retry-After and the call
+        is retried, up to max_retries times. Idle lanes are dropped, and buckets that have refilled are swept away,
+        so that the scheduler does not grow with every channel the bot ever posts in.
+
+        tier_rates: Requests per minute for each tier, e.g. {"3": 50}.
+        channel_rate: Messages per second per channel.
+        max_retries: Retries of a call that was rate limited nonetheless.
+        """
+        self.tier_rates = tier_rates
+        self.channel_rate = channel_rate
+        self.max_retries = max_retries
+        self.buckets: Dict[Hashable, TokenBucket] = {}
+        self.lanes: Dict[Hashable, _Lane] = {}
+        self._seq = itertools.count()
+        self._swept = time.monotonic()
+        self.waited = 0.0
+        self.superseded = 0
+        self.ratelimited = 0
+
+    def _bucket(self, key: Hashable, *, capacity: float, period: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(capacity=capacity, period=period)
+        return bucket
+
+    def _route(self, *, method: str, workspace: str | None, channel: str | None) -> Tuple[Hashable, List[TokenBucket]] | None:
+        """
+        The key of the lane the call waits in, and the buckets it takes a token from. None for calls that are not paced.
+        """
+        if workspace is None or method in UNLIMITED_METHODS:
+            return None
+        tier = METHOD_TIERS.get(method, 3)
+        buckets = [self._bucket((workspace, method), capacity=float(self.tier_rates[str(tier)]), period=60.0)]
+        if method in CHANNEL_METHODS and channel is not None:
+            key = (workspace, "channel", channel)
+            buckets.append(self._bucket(key, capacity=1.0, period=1.0 / self.channel_rate))
+            return key, buckets
+        return (workspace, method), buckets
+
+    def _lane(self, key: Hashable) -> _Lane:
+        lane = self.lanes.get(key)
+        if lane is None:
+            lane = self.lanes[key] = _Lane()
+        return lane
+
+    async def call(
+        self,
+        method: str,
+        *,
+        workspace: str | None,
+        channel: str | None = None,
+        ts: str | None = None,
+        send: Callable[[], Awaitable[AsyncSlackResponse]],
+    ) -> AsyncSlackResponse:
+        """
+        Sends the call when its lane allows.
+
+        method: The Slack API method, e.g. "chat.update".
+        workspace: Identifies the workspace the call counts against. None for calls not limited per workspace.
+        channel, ts: The channel and message the call is about, if any.
+        send: Makes the call.
+        """
+        route = self._route(method=method, workspace=workspace, channel=channel)
+        if route is None:
+            return await send()
+
+        lane_key, buckets = route
+        key = (channel, ts) if method == "chat.update" and ts is not None else None
+        waiter = _Waiter(priority=_priority.get(), seq=next(self._seq), key=key, buckets=buckets)
+        try:
+            for attempt in itertools.count():
+                superseded_by = await self._turn(lane_key, waiter)
+                if superseded_by is not None:
+                    try:
+                        response = await asyncio.shield(superseded_by.done)
+                        break
+                    except asyncio.CancelledError:
+                        if not superseded_by.done.cancelled():
+                            raise
+                        # The newer update was cancelled before it was sent, so this one goes out after all
+                        waiter.released = asyncio.get_running_loop().create_future()
+                        continue
+                try:
+                    response = await send()
+                    break
+                except SlackApiError as e:
+                    if e.response["error"] != "ratelimited" or attempt >= self.max_retries:
+                        raise
+                    retry_after = float(e.response.headers.get("Retry-After", 1))
+                    logger.warning(f"{method} was rate limited despite pacing. Pausing for {retry_after} seconds.")
+                    self.ratelimited += 1
+                    for bucket in waiter.buckets:
+                        # Empty the bucket so that its next token arrives in retry_after seconds
+                        bucket.set_remaining(1 - retry_after * bucket.rate)
+                    waiter.released = asyncio.get_running_loop().create_future()
+        except asyncio.CancelledError:
+            waiter.done.cancel()
+            raise
+        except Exception as e:
+            if not waiter.done.done():
+                waiter.done.set_exception(e)
+                waiter.done.exception()  # retrieved here; superseded callers re-raise it
+            raise
+        waiter.done.set_result(response)
+        return response
+
+    async def _turn(self, lane_key: Hashable, waiter: _Waiter) -> _Waiter | None:
+        lane = self._lane(lane_key)
+        if waiter.key is not None:
+            latest = lane.latest.get(waiter.key)
+            if latest is not None and latest is not waiter and not latest.done.cancelled():
+                if latest.seq > waiter.seq:
+                    # A newer update of the message was queued while this one was being retried
+                    return latest
+                if not latest.released.done():
+                    latest.released.set_result(waiter)
+                    self.superseded += 1
+            lane.latest[waiter.key] = waiter
+            lane.latest.move_to_end(waiter.key)
+            while len(lane.latest) > SUPERSEDE_HISTORY:
+                lane.latest.popitem(last=False)
+
+        heapq.heappush(lane.queue, waiter)
+        if lane.pump is None:
+            lane.pump = asyncio.create_task(self._pump(lane_key, lane))
+        return await waiter.released
+
+    async def _pump(self, key: Hashable, lane: _Lane) -> None:
+        try:
+            while lane.queue:
+                waiter = lane.queue[0]
+                if waiter.released.done():
+                    # Superseded, or its caller was cancelled
+                    heapq.heappop(lane.queue)
+                    continue
+                wait = max(bucket.wait_time(1) for bucket in waiter.buckets)
+                if wait > 0:
+                    self.waited += wait
+                    await asyncio.sleep(wait)
+                    continue
+                heapq.heappop(lane.queue)
+                for bucket in waiter.buckets:
+                    bucket.take(1)
+                waiter.released.set_result(None)
+        finally:
+            lane.pump = None
+            if not lane.queue and self.lanes.get(key) is lane:
+                # Idle; the next call starts a new lane. Updates still in flight need no superseding.
+                del self.lanes[key]
+            self._sweep()
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        if now - self._swept < BUCKET_SWEEP_INTERVAL:
+            return
+        self._swept = now
+        # A queued call holds on to its buckets, so those must stay the ones that new calls find
+        held = {id(bucket) for lane in self.lanes.values() for waiter in lane.queue for bucket in waiter.buckets}
+        for key, bucket in list(self.buckets.items()):
+            if id(bucket) not in held and bucket.wait_time(bucket.capacity) == 0:
+                del self.buckets[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "waited_seconds": self.waited,
+            "superseded": self.superseded,
+            "ratelimited": self.ratelimited,
+            "queued": sum(len(lane.queue) for lane in self.lanes.values()),
+            "lanes": len(self.lanes),
+            "buckets": len(self.buckets),
+        }
+
+
+class ScheduledWebClient(AsyncWebClient):
+    def __init__(self, *, scheduler: SlackScheduler | None = None, **kwargs):
+        """
+        AsyncWebClient whose calls are paced by a SlackScheduler.
+        """
+        super().__init__(**kwargs)
+        self.scheduler = scheduler or SlackScheduler()
+
+    async def api_call(self, api_method: str, **kwargs) -> AsyncSlackResponse:
+        args = next(
+            (args for args in (kwargs.get("json"), kwargs.get("params"), kwargs.get("data")) if isinstance(args, dict) and args), {}
+        )
+        token = args.get("token") or self.token
+
+        def send() -> Awaitable[AsyncSlackResponse]:
+            # AsyncWebClient pops the token out of the request arguments, so every attempt gets its own copy
+            attempt_kwargs = {key: dict(value) if isinstance(value, dict) else value for key, value in kwargs.items()}
+            return super(ScheduledWebClient, self).api_call(api_method, **attempt_kwargs)
+
+        return await self.scheduler.call(
+            api_method,
+            workspace=hashlib.sha256(token.encode("utf-8")).hexdigest()[:16] if token else None,
+            channel=args.get("channel"),
+            ts=args.get("ts"),
+            send=send,
+        )
@@ -5,6 +5,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+import asyncio
+
 from slack_sdk.errors import SlackApiError
 
 from .errors import UserTokenNoneError
@@ -26,6 +28,7 @@ class Search:
         """
         self.client = cslack.app.client
         self.installation_store = cslack.installation_store
+        self.directory = cslack.directory
 
     async def async_setup(self):
         """
@@ -53,12 +56,13 @@ class Search:
         if filter is None:
             filter = lambda message: True
 
+        messages = [message for message in messages if not filter(message)]
+        # Resolved together, so each user and channel is looked up at most once
+        texts = await asyncio.gather(*(self.directory.resolve_mentions(message["text"], context=context) for message in messages))
+
         str_messages = []
-        for message in messages:
-            if filter(message):
-                continue
+        for message, text in zip(messages, texts):
             username = message["username"]
-            text = message["text"]
             channel = message["channel"]["name"]
             permalink = message["permalink"]
             str_messages.append(f"<{permalink}|channel: {channel}, username: {username}, text: {text}>")
@@ -0,0 +1,233 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import asyncio
+import time
+
+from cogniq.config import SLACK_STREAM_MIN_INTERVAL, SLACK_STREAM_MAX_INTERVAL, SLACK_STREAM_TARGET_CHARS, SLACK_STREAM_TAIL_CHARS
+
+from .scheduler import PRIORITY_LOW, PRIORITY_NORMAL
+
+if TYPE_CHECKING:
+    from .cogniq_slack import CogniqSlack
+
+# Weight of the newest sample in the latency and arrival rate averages
+EWMA_ALPHA = 0.3
+
+
+class StreamBuffer:
+    def __init__(self, publisher: StreamPublisher, header: str = ""):
+        """
+        Text streamed into one part of a message, after a fixed header.
+
+        The text is kept as the list of appended chunks with its length, so that appending a token costs the same
+        however long the text has grown; it is joined only when asked for. version counts the appends, so the
+        publisher can tell whether it changed.
+        """
+        self.publisher = publisher
+        self.header = header
+        self.chunks: List[str] = []
+        self.length = 0  # characters in chunks
+        self.version = 0
+        self._text: Tuple[int, str] | None = None  # (version, joined text)
+        self._tail: Tuple[int, int, str] | None = None  # (version, max_chars, tail)
+
+    def append(self, text: str) -> None:
+        if not text:
+            return
+        self.chunks.append(text)
+        self.length += len(text)
+        self.version += 1
+        self.publisher.notify(len(text))
+
+    def __len__(self) -> int:
+        return len(self.header) + self.length
+
+    @property
+    def text(self) -> str:
+        """
+        The header and everything appended.
+        """
+        if self._text is None or self._text[0] != self.version:
+            self._text = (self.version, self.header + "".join(self.chunks))
+        return self._text[1]
+
+    def tail(self, max_chars: int) -> str:
+        """
+        The last max_chars characters appended, found from the end of the chunks, so in time bound by max_chars.
+        """
+        if self._tail is None or self._tail[:2] != (self.version, max_chars):
+            parts: List[str] = []
+            remaining = max_chars
+            for chunk in reversed(self.chunks):
+                if remaining <= 0:
+                    break
+                parts.append(chunk[-remaining:])
+                remaining -= len(chunk)
+            self._tail = (self.version, max_chars, "".join(reversed(parts)))
+        return self._tail[2]
+
+
+def tail_renderer(max_chars: int = SLACK_STREAM_TAIL_CHARS) -> Callable[[Dict[str, StreamBuffer]], str]:
+    """
+    Renders each buffer as its header and its last max_chars characters, so that the message, and the work of
+    rendering it, stays the same size however long the streams grow.
+    """
+
+    def render(buffers: Dict[str, StreamBuffer]) -> str:
+        return "\n".join(
+            buffer.header + ("…" if buffer.length > max_chars else "") + buffer.tail(max_chars) for buffer in buffers.values()
+        )
+
+    return render
+
+
+class StreamPublisher:
+    def __init__(
+        self,
+        *,
+        cslack: CogniqSlack,
+        channel: str,
+        ts: str | None,
+        context: Dict[str, Any],
+        thread_ts: str | None = None,
+        render: Callable[[Dict[str, StreamBuffer]], str] | None = None,
+        min_interval: float = SLACK_STREAM_MIN_INTERVAL,
+        max_interval: float = SLACK_STREAM_MAX_INTERVAL,
+        target_chars: int = SLACK_STREAM_TARGET_CHARS,
+    ):
+        """
+        Streams text into one Slack message with chat.update, sending only what changed.
+
+        The publisher wakes when a buffer is appended to, and sends the current rendering of all buffers unless no buffer's
+        version moved since the last send. At most one update is in flight, and each carries the newest state, so updates
+        that would have been overtaken are never sent. Between updates it waits an interval that adapts to the stream:
+        long enough for about target_chars new characters at the observed arrival rate, and at least twice the observed
+        chat.update latency, within min_interval and max_interval. Intermediate updates are low priority and may be
+        dropped by the scheduler; close() always delivers the final state.
+
+        cslack (CogniqSlack): Sends the updates.
+        channel, ts: The message to update. With ts None, the first update posts the message in thread_ts instead.
+        context (dict): Context of the Slack request.
+        render (callable): Renders the buffers as the message text. Defaults to joining them with newlines.
+        """
+        self.cslack = cslack
+        self.channel = channel
+        self.ts = ts
+        self.thread_ts = thread_ts
+        self.context = context
+        self.render = render or (lambda buffers: "\n".join(buffer.text for buffer in buffers.values()))
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_chars = target_chars
+
+        self.buffers: Dict[str, StreamBuffer] = {}
+        self._changed = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._sent_versions: Tuple[int, ...] | None = None
+        self.closed = False
+
+        self._latency: float | None = None  # seconds per chat.update
+        self._char_rate: float | None = None  # characters per second
+        self._chars_since_send = 0
+        self._last_send = time.monotonic()
+        self.sent = 0
+        self.skipped = 0
+
+    def add_buffer(self, name: str, header: str = "") -> StreamBuffer:
+        buffer = self.buffers[name] = StreamBuffer(self, header)
+        self._changed.set()
+        return buffer
+
+    def notify(self, chars: int = 0) -> None:
+        self._chars_since_send += chars
+        self._changed.set()
+
+    def versions(self) -> Tuple[int, ...]:
+        return tuple(buffer.version for buffer in self.buffers.values())
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def interval(self) -> float:
+        """
+        Seconds to wait after an update before sending the next one.
+        """
+        interval = self.min_interval
+        if self._latency is not None:
+            interval = max(interval, 2 * self._latency)
+        if self._char_rate:
+            interval = max(interval, self.target_chars / self._char_rate)
+        return min(interval, self.max_interval)
+
+    async def _run(self) -> None:
+        while not self._closing.is_set():
+            await self._changed.wait()
+            if self._closing.is_set():
+                return
+            self._changed.clear()
+            await self._publish(priority=PRIORITY_LOW)
+            try:
+                await asyncio.wait_for(self._closing.wait(), timeout=self.interval())
+            except asyncio.TimeoutError:
+                pass
+
+    async def _publish(self, *, priority: int, final: bool = False) -> None:
+        versions = self.versions()
+        if versions == self._sent_versions:
+            self.skipped += 1
+            return
+        text = self.render(self.buffers)
+        if not text:
+            return
+
+        started = time.monotonic()
+        elapsed = started - self._last_send
+        if elapsed > 0 and self._chars_since_send:
+            self._char_rate = self._ewma(self._char_rate, self._chars_since_send / elapsed)
+        self._chars_since_send = 0
+        self._last_send = started
+        try:
+            await self._send(text, priority=priority)
+        except Exception as e:
+            if final:
+                raise
+            # The next update carries this one's text as well
+            logger.warning(f"Could not stream an update to {self.channel}/{self.ts}: {e}")
+            return
+        self._latency = self._ewma(self._latency, time.monotonic() - started)
+        self._sent_versions = versions
+        self.sent += 1
+
+    async def _send(self, text: str, *, priority: int) -> None:
+        if self.ts is None:
+            response = await self.cslack.chat_postMessage(
+                channel=self.channel, thread_ts=self.thread_ts, text=text, context=self.context, priority=priority
+            )
+            self.ts = response["ts"]
+        else:
+            await self.cslack.chat_update(channel=self.channel, ts=self.ts, text=text, context=self.context, priority=priority)
+
+    def _ewma(self, average: float | None, sample: float) -> float:
+        return sample if average is None else EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * average
+
+    async def close(self, final_text: str | None = None) -> None:
+        """
+        Stops streaming and delivers the final state: final_text if given, otherwise the rendered buffers.
+        Unlike intermediate updates, a failure to deliver it is raised.
+        """
+        self.closed = True
+        self._closing.set()
+        self._changed.set()
+        if self._task is not None:
+            await self._task
+        if final_text and final_text != self.render(self.buffers):
+            await self._send(final_text, priority=PRIORITY_NORMAL)
+        else:
+            await self._publish(priority=PRIORITY_NORMAL, final=True)
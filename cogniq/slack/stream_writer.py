@@ -0,0 +1,127 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import asyncio
+
+from cogniq.config import SLACK_STREAM_MAX_CHARS
+
+from .stream_publisher import StreamPublisher, StreamBuffer
+
+if TYPE_CHECKING:
+    from .cogniq_slack import CogniqSlack
+
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """
+    Splits text into the messages a SlackStreamWriter streams it into.
+    """
+    return [text[start : start + max_chars] for start in range(0, len(text), max_chars)]
+
+
+class SlackStreamWriter:
+    def __init__(
+        self,
+        *,
+        cslack: CogniqSlack,
+        channel: str,
+        ts: str,
+        context: Dict[str, Any],
+        thread_ts: str | None = None,
+        max_chars: int = SLACK_STREAM_MAX_CHARS,
+    ):
+        """
+        Streams an answer into a Slack reply as it is generated.
+
+        The writer is a stream callback: pass it as stream_callback, or feed it an async iterator of text with consume().
+        The text is published with throttled chat.update calls (see StreamPublisher), the first as soon as the first
+        token arrives. When the reply reaches max_chars, the text continues in a new message in the thread, because
+        Slack truncates messages longer than 40,000 characters. close() flushes whatever was streamed, so it is meant
+        to be called in a finally block, with the complete answer when there is one.
+
+        cslack (CogniqSlack): Sends the messages.
+        channel, ts: The reply to stream into, e.g. "Let me figure that out...".
+        context (dict): Context of the Slack request.
+        thread_ts: The thread that continuation messages are posted in. Defaults to ts.
+        max_chars (int): Characters per message.
+        """
+        self.cslack = cslack
+        self.channel = channel
+        self.context = context
+        self.thread_ts = thread_ts or ts
+        self.max_chars = max_chars
+        self._parts: List[str] = []
+        self.publishers: List[StreamPublisher] = []
+        self._closing: List[asyncio.Task] = []  # publishers finishing the messages already filled
+        self._buffer = self._new_message(ts)
+
+    def _new_message(self, ts: str | None) -> StreamBuffer:
+        publisher = StreamPublisher(cslack=self.cslack, channel=self.channel, ts=ts, thread_ts=self.thread_ts, context=self.context)
+        self.publishers.append(publisher)
+        buffer = publisher.add_buffer("text")
+        publisher.start()
+        return buffer
+
+    @property
+    def text(self) -> str:
+        """
+        The text written so far.
+        """
+        return "".join(self._parts)
+
+    def __call__(self, token: str, **kwargs) -> None:
+        self.write(token)
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+        while text:
+            room = self.max_chars - len(self._buffer)
+            if room <= 0:
+                self._closing.append(asyncio.create_task(self.publishers[-1].close()))
+                self._buffer = self._new_message(None)
+                continue
+            self._buffer.append(text[:room])
+            text = text[room:]
+
+    async def consume(self, stream: AsyncIterator[str]) -> str:
+        """
+        Writes every chunk of stream, and returns the text streamed so far.
+        """
+        async for text in stream:
+            self.write(text)
+        return self.text
+
+    async def close(self, final_text: str | None = None) -> None:
+        """
+        Delivers the final state of every message: final_text when given, otherwise the streamed text.
+        final_text is split into messages the same way, and replaces what was streamed into them; continuation
+        messages it does not need are deleted. Every message is finished before the first failure is raised.
+        """
+        chunks = split_text(final_text, self.max_chars) if final_text else []
+        results: List[Any] = list(await asyncio.gather(*self._closing, return_exceptions=True))
+        for index, publisher in enumerate(self.publishers):
+            try:
+                if chunks and index >= len(chunks):
+                    await publisher.close()
+                    if publisher.ts is not None:
+                        await self.cslack.chat_delete(channel=self.channel, ts=publisher.ts, context=self.context)
+                elif publisher.closed and index < len(chunks) and publisher.ts is None:
+                    # Its message was never posted
+                    await self.cslack.chat_postMessage(
+                        channel=self.channel, thread_ts=self.thread_ts, text=chunks[index], context=self.context
+                    )
+                elif publisher.closed and index < len(chunks) and chunks[index] != publisher.buffers["text"].text:
+                    # Already finished with the streamed text; the final text replaces it
+                    await self.cslack.chat_update(channel=self.channel, ts=publisher.ts, text=chunks[index], context=self.context)
+                elif not publisher.closed:
+                    await publisher.close(final_text=chunks[index] if index < len(chunks) else None)
+            except Exception as e:
+                results.append(e)
+        for chunk in chunks[len(self.publishers) :]:
+            await self.cslack.chat_postMessage(channel=self.channel, thread_ts=self.thread_ts, text=chunk, context=self.context)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
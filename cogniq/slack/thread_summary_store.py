@@ -0,0 +1,69 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, Text, and_
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+class ThreadSummary(NamedTuple):
+    summary: str
+    watermark_ts: str
+
+
+class ThreadSummaryStore:
+    def __init__(self, *, engine: AsyncEngine):
+        """
+        Rolling summaries of Slack threads, one per (team, channel, thread_ts).
+        Each holds the summary of the thread up to and including the message at watermark_ts.
+        """
+        self.engine = engine
+        self.metadata = MetaData()
+        self.table = Table(
+            "thread_summaries",
+            self.metadata,
+            Column("team_id", String(32), primary_key=True),
+            Column("channel_id", String(32), primary_key=True),
+            Column("thread_ts", String(32), primary_key=True),
+            Column("summary", Text),
+            Column("watermark_ts", String(32)),
+            Column("updated_at", DateTime(timezone=True)),
+        )
+
+    def _where(self, *, team_id: str, channel_id: str, thread_ts: str):
+        c = self.table.c
+        return and_(c.team_id == team_id, c.channel_id == channel_id, c.thread_ts == thread_ts)
+
+    async def get(self, *, team_id: str, channel_id: str, thread_ts: str) -> ThreadSummary | None:
+        try:
+            async with self.engine.begin() as conn:
+                result = await conn.execute(self.table.select().where(self._where(team_id=team_id, channel_id=channel_id, thread_ts=thread_ts)))
+                row = result.one_or_none()
+        except Exception as e:
+            logger.warning(f"Thread summary lookup failed, summarizing from scratch: {e}")
+            return None
+        if row is None:
+            return None
+        return ThreadSummary(summary=row["summary"], watermark_ts=row["watermark_ts"])
+
+    async def save(self, *, team_id: str, channel_id: str, thread_ts: str, summary: ThreadSummary) -> None:
+        """
+        Stores the summary, unless a concurrent turn already stored one with a later watermark.
+        """
+        where = self._where(team_id=team_id, channel_id=channel_id, thread_ts=thread_ts)
+        values = {"summary": summary.summary, "watermark_ts": summary.watermark_ts, "updated_at": datetime.now(timezone.utc)}
+        try:
+            async with self.engine.begin() as conn:
+                result = await conn.execute(self.table.select().where(where))
+                row = result.one_or_none()
+                if row is None:
+                    await conn.execute(self.table.insert().values(team_id=team_id, channel_id=channel_id, thread_ts=thread_ts, **values))
+                elif float(row["watermark_ts"]) < float(summary.watermark_ts):
+                    await conn.execute(self.table.update().where(where).values(**values))
+        except Exception as e:
+            logger.warning(f"Thread summary write failed: {e}")
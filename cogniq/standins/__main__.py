@@ -0,0 +1,55 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import argparse
+
+from aiohttp import web
+
+from .app import create_app
+from .settings import StandinSettings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-ins for the OpenAI, Perplexity, Anthropic, Slack and Bing APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-median", type=float, default=0.3, help="median seconds to first byte")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="sigma of the log-normal latency")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--response-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429s")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--threads-per-channel", type=int, default=20)
+    parser.add_argument("--replies-per-thread", type=int, default=30)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    settings = StandinSettings(
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    app = create_app(
+        settings=settings,
+        base_url=f"http://{args.host}:{args.port}",
+        channels=args.channels,
+        threads_per_channel=args.threads_per_channel,
+        replies_per_thread=args.replies_per_thread,
+    )
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
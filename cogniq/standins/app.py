@@ -0,0 +1,45 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+from aiohttp import web
+
+from .bing import BingStandin
+from .inference import InferenceStandin
+from .settings import StandinSettings
+from .slack import SlackStandin
+
+
+def create_app(*, settings: StandinSettings, base_url: str, **slack_kwargs) -> web.Application:
+    """
+    One server for all stand-ins, each under its own path prefix:
+
+    - /openai/v1       OPENAI_API_BASE
+    - /perplexity      PERPLEXITY_API_BASE
+    - /anthropic       ANTHROPIC_API_BASE
+    - /slack/api/      SLACK_API_URL
+    - /bing            BING_SEARCH_ENDPOINT
+
+    GET /stats reports request counts.
+    """
+    app = web.Application()
+    inference = InferenceStandin(settings)
+    slack = SlackStandin(settings, **slack_kwargs)
+    bing = BingStandin(settings, base_url=base_url)
+    for standin in (inference, slack, bing):
+        standin.add_routes(app)
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "inference": {"requests": inference.requests},
+                "slack": {"requests": slack.requests, "calls": slack.calls},
+                "bing": {"requests": bing.requests},
+            }
+        )
+
+    app.router.add_get("/stats", stats)
+    return app
@@ -0,0 +1,65 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+from aiohttp import web
+
+from .settings import StandinSettings
+
+
+class BingStandin:
+    def __init__(self, settings: StandinSettings, *, base_url: str):
+        """
+        Stand-in for the Bing Web Search API, and for the pages its results link to,
+        so that the web retriever can fetch and preprocess them.
+
+        base_url: The URL this server is reachable at, used to build result links.
+        """
+        self.settings = settings
+        self.base_url = base_url.rstrip("/")
+        self.requests = 0
+
+    def add_routes(self, app: web.Application) -> None:
+        app.router.add_get("/bing/v7.0/search", self.search)
+        app.router.add_get("/bing/pages/{page}", self.page)
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        failure = self.settings.injected_failure(
+            rate_limited_body={"error": {"code": "429", "message": "Rate limit is exceeded."}},
+            error_body={"error": {"code": "500", "message": "Internal server error."}},
+        )
+        await self.settings.wait_latency()
+        if failure is not None:
+            return failure
+
+        query = request.query.get("q", "")
+        count = int(request.query.get("count", 10))
+        value = [
+            {
+                "id": f"https://api.bing.microsoft.com/api/v7/#WebPages.{i}",
+                "name": f"{query} - result {i}",
+                "url": f"{self.base_url}/bing/pages/{i}",
+                "snippet": "".join(self.settings.words(30)).strip(),
+                "language": "en",
+            }
+            for i in range(count)
+        ]
+        return web.json_response(
+            {
+                "_type": "SearchResponse",
+                "queryContext": {"originalQuery": query},
+                "webPages": {"totalEstimatedMatches": len(value), "value": value},
+                "rankingResponse": {
+                    "mainline": {"items": [{"answerType": "WebPages", "resultIndex": i, "value": {"id": item["id"]}} for i, item in enumerate(value)]}
+                },
+            }
+        )
+
+    async def page(self, request: web.Request) -> web.Response:
+        await self.settings.wait_latency()
+        paragraphs = "".join(f"<p>{''.join(self.settings.words(60))}</p>" for _ in range(5))
+        return web.Response(text=f"<html><head><title>Page {request.match_info['page']}</title></head><body>{paragraphs}</body></html>", content_type="text/html")
@@ -0,0 +1,110 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import time
+import uuid
+
+from aiohttp import web
+
+from .settings import StandinSettings, request_params, sse
+
+
+class InferenceStandin:
+    def __init__(self, settings: StandinSettings):
+        """
+        Stand-in for the OpenAI and Perplexity chat completions API and the Anthropic complete API,
+        streaming or not, with the configured latency, token rate and failures.
+        """
+        self.settings = settings
+        self.requests = 0
+
+    def add_routes(self, app: web.Application) -> None:
+        app.router.add_post("/openai/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/perplexity/chat/completions", self.chat_completions)
+        app.router.add_post("/anthropic/v1/complete", self.anthropic_complete)
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        payload = await request_params(request)
+        failure = self.settings.injected_failure(
+            rate_limited_body={"error": {"type": "requests", "code": "rate_limit_exceeded", "message": "Rate limit reached"}},
+            error_body={"error": {"type": "server_error", "message": "The server had an error while processing your request."}},
+        )
+        await self.settings.wait_latency()
+        if failure is not None:
+            return failure
+
+        model = payload.get("model", "gpt-3.5-turbo")
+        words = self.settings.words(min(self.settings.response_tokens, int(payload.get("max_tokens") or self.settings.response_tokens)))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        headers = {
+            "x-ratelimit-limit-requests": "3500",
+            "x-ratelimit-remaining-requests": "3499",
+            "x-ratelimit-limit-tokens": "90000",
+            "x-ratelimit-remaining-tokens": str(90000 - len(words)),
+        }
+
+        if not payload.get("stream"):
+            message: Dict[str, Any] = {"role": "assistant", "content": "".join(words).strip()}
+            finish_reason = "stop"
+            # Only a named function_call forces a call; "auto" and "none" get ordinary content, like most real answers
+            function_call = payload.get("function_call")
+            if isinstance(function_call, dict) and function_call.get("name"):
+                message = {"role": "assistant", "content": None, "function_call": {"name": function_call["name"], "arguments": '{"phrases": ["*"]}'}}
+                finish_reason = "function_call"
+            return web.json_response(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                    "usage": {"completion_tokens": len(words)},
+                },
+                headers=headers,
+            )
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", **headers})
+        await response.prepare(request)
+        for word in words:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+            }
+            await response.write(sse(chunk))
+            await self.settings.wait_token()
+        await response.write(sse("[DONE]"))
+        return response
+
+    async def anthropic_complete(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        payload = await request_params(request)
+        failure = self.settings.injected_failure(
+            rate_limited_body={"type": "error", "error": {"type": "rate_limit_error", "message": "Rate limited"}},
+            error_body={"type": "error", "error": {"type": "api_error", "message": "Internal server error"}},
+        )
+        await self.settings.wait_latency()
+        if failure is not None:
+            return failure
+
+        model = payload.get("model", "claude-2")
+        words = self.settings.words(min(self.settings.response_tokens, int(payload.get("max_tokens_to_sample") or self.settings.response_tokens)))
+        if not payload.get("stream"):
+            return web.json_response({"type": "completion", "completion": "".join(words), "stop_reason": "stop_sequence", "model": model})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(sse({"type": "ping"}, event="ping"))
+        for word in words:
+            await response.write(sse({"type": "completion", "completion": word, "stop_reason": None, "model": model}, event="completion"))
+            await self.settings.wait_token()
+        await response.write(sse({"type": "completion", "completion": "", "stop_reason": "stop_sequence", "model": model}, event="completion"))
+        return response
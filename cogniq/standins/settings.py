@@ -0,0 +1,101 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import asyncio
+import json
+import math
+import random
+
+from aiohttp import web
+
+
+class StandinSettings:
+    def __init__(
+        self,
+        *,
+        latency_median: float = 0.3,
+        latency_sigma: float = 0.5,
+        tokens_per_second: float = 40.0,
+        response_tokens: int = 120,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int | None = None,
+    ):
+        """
+        Behaviour shared by the stand-in servers.
+
+        latency_median, latency_sigma: Time to first byte is drawn from a log-normal distribution with this median (seconds) and sigma.
+        tokens_per_second: Rate at which streamed completions emit tokens.
+        response_tokens: Number of tokens in a generated completion.
+        error_rate: Fraction of requests answered with a 500.
+        rate_limit_rate: Fraction of requests answered with a 429 and a Retry-After of retry_after seconds.
+        seed: Seed for reproducible runs.
+        """
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+    def sample_latency(self) -> float:
+        if self.latency_median <= 0:
+            return 0.0
+        return self.random.lognormvariate(math.log(self.latency_median), self.latency_sigma)
+
+    async def wait_latency(self) -> None:
+        await asyncio.sleep(self.sample_latency())
+
+    async def wait_token(self) -> None:
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(1 / self.tokens_per_second)
+
+    def injected_failure(self, *, rate_limited_body: Dict[str, Any], error_body: Dict[str, Any]) -> web.Response | None:
+        """
+        Returns a 429 or 500 response when one is due, otherwise None.
+        """
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return web.json_response(rate_limited_body, status=429, headers={"Retry-After": str(self.retry_after)})
+        if roll < self.rate_limit_rate + self.error_rate:
+            return web.json_response(error_body, status=500)
+        return None
+
+    def words(self, n: int | None = None) -> List[str]:
+        """
+        Filler text for generated completions and messages.
+        """
+        n = self.response_tokens if n is None else n
+        return [self.random.choice(WORDS) + " " for _ in range(n)]
+
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog while slack threads stream tokens to many curious users "
+    "latency matters because every conversation waits on the slowest call in its chain"
+).split()
+
+
+async def request_params(request: web.Request) -> Dict[str, Any]:
+    """
+    Merges query string, form and JSON parameters, since clients use all three.
+    """
+    params: Dict[str, Any] = dict(request.query)
+    if request.can_read_body:
+        if request.content_type == "application/json":
+            params.update(await request.json())
+        else:
+            params.update(dict(await request.post()))
+    return params
+
+
+def sse(data: Dict[str, Any] | str, event: str | None = None) -> bytes:
+    payload = data if isinstance(data, str) else json.dumps(data)
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {payload}\n\n".encode("utf-8")
@@ -0,0 +1,204 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import time
+
+from aiohttp import web
+
+from .settings import StandinSettings, request_params
+
+TEAM_ID = "T0STANDIN"
+BOT_USER_ID = "U0STANDINBOT"
+BOT_ID = "B0STANDIN"
+
+
+class SlackStandin:
+    def __init__(self, settings: StandinSettings, *, channels: int = 4, threads_per_channel: int = 20, replies_per_thread: int = 30):
+        """
+        Stand-in for the Slack Web API methods CogniQ calls, backed by an in-memory workspace.
+
+        The workspace is seeded with `channels` channels of `threads_per_channel` threads,
+        each with `replies_per_thread` replies, so that history fetches page like they do against Slack.
+        Rate-limited responses carry `{"ok": false, "error": "ratelimited"}` and a Retry-After header.
+        """
+        self.settings = settings
+        self.requests = 0
+        self.calls: Dict[str, int] = {}
+        self.channels: Dict[str, Dict[str, Any]] = {}
+        self.users: Dict[str, Dict[str, Any]] = {
+            BOT_USER_ID: {"id": BOT_USER_ID, "name": "cogniq", "real_name": "CogniQ", "is_bot": True, "profile": {"bot_id": BOT_ID}},
+        }
+        # channel -> thread_ts -> messages, parent first
+        self.threads: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        self.clock = time.time() - 86400
+        self._seed(channels=channels, threads_per_channel=threads_per_channel, replies_per_thread=replies_per_thread)
+
+    def add_routes(self, app: web.Application) -> None:
+        app.router.add_route("*", "/slack/api/{method}", self.api)
+
+    def _next_ts(self) -> str:
+        self.clock += 0.0001
+        return f"{self.clock:.6f}"
+
+    def _seed(self, *, channels: int, threads_per_channel: int, replies_per_thread: int) -> None:
+        for i in range(4):
+            user_id = f"U0USER{i:04d}"
+            self.users[user_id] = {"id": user_id, "name": f"user{i}", "real_name": f"User {i}", "is_bot": False, "profile": {}}
+        user_ids = [user_id for user_id in self.users if user_id != BOT_USER_ID]
+        for c in range(channels):
+            channel_id = f"C0STANDIN{c:03d}"
+            self.channels[channel_id] = {"id": channel_id, "name": f"channel-{c}", "is_channel": True, "is_member": True}
+            self.threads[channel_id] = {}
+            for t in range(threads_per_channel):
+                thread_ts = self._next_ts()
+                messages = [self._message(user=user_ids[t % len(user_ids)], ts=thread_ts, thread_ts=thread_ts, words=20)]
+                for r in range(replies_per_thread):
+                    user = BOT_USER_ID if r % 2 else user_ids[(t + r) % len(user_ids)]
+                    messages.append(self._message(user=user, ts=self._next_ts(), thread_ts=thread_ts, words=40))
+                self.threads[channel_id][thread_ts] = messages
+
+    def _message(self, *, user: str, ts: str, thread_ts: str | None = None, text: str | None = None, words: int = 20) -> Dict[str, Any]:
+        message = {"type": "message", "user": user, "ts": ts, "text": text if text is not None else "".join(self.settings.words(words)).strip()}
+        if thread_ts is not None:
+            message["thread_ts"] = thread_ts
+        if user == BOT_USER_ID:
+            message["bot_id"] = BOT_ID
+        return message
+
+    async def api(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params = await request_params(request)
+        failure = self.settings.injected_failure(
+            rate_limited_body={"ok": False, "error": "ratelimited"},
+            error_body={"ok": False, "error": "internal_error"},
+        )
+        await self.settings.wait_latency()
+        if failure is not None:
+            return failure
+
+        handler = getattr(self, "_" + method.replace(".", "_"), None)
+        if handler is None:
+            return web.json_response({"ok": False, "error": "unknown_method"})
+        return web.json_response(handler(params))
+
+    def _find(self, channel: str, ts: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]] | None:
+        for messages in self.threads.get(channel, {}).values():
+            for message in messages:
+                if message["ts"] == ts:
+                    return messages, message
+        return None
+
+    def _page(self, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, Any]:
+        limit = int(params.get("limit") or 100)
+        start = int(params.get("cursor") or 0)
+        page = messages[start : start + limit]
+        has_more = start + limit < len(messages)
+        return {
+            "ok": True,
+            "messages": page,
+            "has_more": has_more,
+            "response_metadata": {"next_cursor": str(start + limit) if has_more else ""},
+        }
+
+    def _in_window(self, message: Dict[str, Any], params: Dict[str, Any]) -> bool:
+        ts = float(message["ts"])
+        if params.get("oldest") and ts < float(params["oldest"]):
+            return False
+        if params.get("latest") and ts > float(params["latest"]):
+            return False
+        return True
+
+    def _auth_test(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"ok": True, "url": "https://standin.slack.com/", "team": "Stand-in", "user": "cogniq", "team_id": TEAM_ID, "user_id": BOT_USER_ID, "bot_id": BOT_ID}
+
+    def _oauth_v2_access(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "ok": True,
+            "app_id": "A0STANDIN",
+            "authed_user": {"id": "U0USER0000", "scope": "search:read", "access_token": "xoxp-standin", "token_type": "user"},
+            "scope": "app_mentions:read,channels:history,chat:write,groups:history,im:history,mpim:history",
+            "token_type": "bot",
+            "access_token": "xoxb-standin",
+            "bot_user_id": BOT_USER_ID,
+            "team": {"id": TEAM_ID, "name": "Stand-in"},
+            "enterprise": None,
+            "is_enterprise_install": False,
+        }
+
+    def _bots_info(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"ok": True, "bot": {"id": BOT_ID, "name": "cogniq", "user_id": BOT_USER_ID}}
+
+    def _users_info(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        user = self.users.get(params.get("user", ""))
+        return {"ok": True, "user": user} if user else {"ok": False, "error": "user_not_found"}
+
+    def _users_list(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"ok": True, "members": list(self.users.values()), "response_metadata": {"next_cursor": ""}}
+
+    def _conversations_info(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        channel = self.channels.get(params.get("channel", ""))
+        return {"ok": True, "channel": channel} if channel else {"ok": False, "error": "channel_not_found"}
+
+    def _conversations_list(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"ok": True, "channels": list(self.channels.values()), "response_metadata": {"next_cursor": ""}}
+
+    def _conversations_history(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        channel = params.get("channel", "")
+        if channel not in self.threads:
+            return {"ok": False, "error": "channel_not_found"}
+        parents = [dict(messages[0], reply_count=len(messages) - 1) for messages in self.threads[channel].values()]
+        parents = [message for message in reversed(parents) if self._in_window(message, params)]  # newest first, like Slack
+        return self._page(parents, params)
+
+    def _conversations_replies(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        found = self._find(params.get("channel", ""), params.get("ts", ""))
+        if found is None:
+            return {"ok": False, "error": "thread_not_found"}
+        messages, _ = found
+        parent, replies = messages[0], [message for message in messages[1:] if self._in_window(message, params)]
+        return self._page([parent, *replies], params)
+
+    def _chat_postMessage(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        channel = params.get("channel", "")
+        if channel not in self.threads:
+            self.channels[channel] = {"id": channel, "name": channel, "is_channel": True, "is_member": True}
+            self.threads[channel] = {}
+        ts = self._next_ts()
+        thread_ts = params.get("thread_ts") or ts
+        message = self._message(user=BOT_USER_ID, ts=ts, thread_ts=thread_ts, text=params.get("text", ""))
+        self.threads[channel].setdefault(thread_ts, []).append(message)
+        return {"ok": True, "channel": channel, "ts": ts, "message": message}
+
+    def _chat_update(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        channel = params.get("channel", "")
+        found = self._find(channel, params.get("ts", ""))
+        if found is None:
+            return {"ok": False, "error": "message_not_found"}
+        _, message = found
+        message["text"] = params.get("text", "")
+        return {"ok": True, "channel": channel, "ts": message["ts"], "text": message["text"], "message": message}
+
+    def _search_messages(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        query = str(params.get("query", "")).lower()
+        terms = [term for term in query.replace('"', " ").split() if term not in ("or", "and")]
+        matches = []
+        for channel_id, threads in self.threads.items():
+            for messages in threads.values():
+                for message in messages:
+                    if not terms or any(term in message["text"].lower() for term in terms):
+                        matches.append(
+                            {
+                                **message,
+                                "channel": {"id": channel_id, "name": self.channels[channel_id]["name"]},
+                                "username": self.users.get(message["user"], {}).get("name", message["user"]),
+                                "permalink": f"https://standin.slack.com/archives/{channel_id}/p{message['ts'].replace('.', '')}",
+                            }
+                        )
+        count = int(params.get("count") or 20)
+        return {"ok": True, "query": query, "messages": {"total": len(matches), "matches": matches[:count]}}
@@ -0,0 +1,2 @@
+from .pooled_transport import PooledTransport, shared_transport
+from .sse import SSEEvent, SSEParser
@@ -0,0 +1,134 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import asyncio
+
+import aiohttp
+
+from cogniq.config import (
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_POOL_KEEPALIVE_TIMEOUT,
+    HTTP_POOL_DNS_CACHE_TTL,
+    HTTP_REQUEST_TIMEOUT,
+)
+
+
+class PooledTransport:
+    def __init__(
+        self,
+        *,
+        limit: int = HTTP_POOL_LIMIT,
+        limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout: float = HTTP_POOL_KEEPALIVE_TIMEOUT,
+        dns_cache_ttl: int = HTTP_POOL_DNS_CACHE_TTL,
+        request_timeout: float = HTTP_REQUEST_TIMEOUT,
+    ):
+        """
+        A long-lived aiohttp session shared by the inference backends.
+
+        Connections are kept alive between requests, capped per host, and DNS lookups are cached,
+        so that a completion does not pay for DNS, TCP and TLS setup every time.
+        Please call async_setup before the first request, and async_close on shutdown.
+
+        ```
+        transport = shared_transport()
+        await transport.async_setup()
+        ...
+        await transport.async_close()
+        ```
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.request_timeout = request_timeout
+
+        self._connector: aiohttp.TCPConnector | None = None
+        self._session: aiohttp.ClientSession | None = None
+        self._lock = asyncio.Lock()
+        self.requests = 0
+
+    async def async_setup(self) -> None:
+        """
+        Opens the connection pool. Safe to call more than once.
+        """
+        async with self._lock:
+            if self._session is not None and not self._session.closed:
+                return
+            self._connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+                enable_cleanup_closed=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=self._connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            )
+            logger.info("Opened HTTP connection pool: limit=%s limit_per_host=%s", self.limit, self.limit_per_host)
+
+    async def async_close(self) -> None:
+        """
+        Closes the pooled connections. The pool is reopened by the next async_setup.
+        """
+        async with self._lock:
+            if self._session is not None and not self._session.closed:
+                await self._session.close()
+                logger.info("Closed HTTP connection pool after %s requests", self.requests)
+            self._session = None
+            self._connector = None
+
+    async def session(self) -> aiohttp.ClientSession:
+        """
+        Returns the pooled session, opening it if async_setup has not been called yet.
+        """
+        if self._session is None or self._session.closed:
+            await self.async_setup()
+        return self._session  # type: ignore # async_setup guarantees the session
+
+    async def post(self, url: str, **kwargs) -> aiohttp.ClientResponse:
+        """
+        Sends a POST over the pool. Use as `async with await transport.post(...) as response:`.
+        """
+        session = await self.session()
+        self.requests += 1
+        return await session.post(url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns a snapshot of the pool, for logging and health checks.
+        """
+        connector = self._connector
+        if connector is None or connector.closed:
+            return {"open": False, "requests": self.requests}
+        acquired = len(connector._acquired)  # aiohttp does not expose a public counter
+        idle = sum(len(conns) for conns in connector._conns.values())
+        return {
+            "open": True,
+            "requests": self.requests,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "acquired": acquired,
+            "idle": idle,
+            "acquired_per_host": {str(key): len(conns) for key, conns in connector._acquired_per_host.items()},
+        }
+
+
+_shared_transport: PooledTransport | None = None
+
+
+def shared_transport() -> PooledTransport:
+    """
+    Returns the process-wide transport used by every inference backend.
+    """
+    global _shared_transport
+    if _shared_transport is None:
+        _shared_transport = PooledTransport()
+    return _shared_transport
@@ -0,0 +1,83 @@
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SSEEvent(NamedTuple):
+    event: str
+    data: str
+
+
+class SSEParser:
+    def __init__(self):
+        """
+        Incremental parser for server-sent events (text/event-stream).
+
+        Feed it raw chunks as they arrive from the network; it returns the events completed by each chunk.
+        Frames may be split anywhere across chunks. Multi-line `data:` fields are joined with newlines,
+        and comment lines (keep-alives starting with `:`) are skipped.
+
+        Lines are scanned in place within the receive buffer; only the field values are sliced out,
+        and the consumed prefix is discarded once per chunk rather than once per line.
+
+        ```
+        parser = SSEParser()
+        async for chunk in response.content.iter_any():
+            for event in parser.feed(chunk):
+                ...
+        ```
+        """
+        self._buffer = bytearray()
+        self._event = ""
+        self._data: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        buffer = self._buffer
+        buffer += chunk
+        events: List[SSEEvent] = []
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end == -1:
+                break
+            line_end = end - 1 if end > start and buffer[end - 1] == 0x0D else end  # tolerate \r\n
+            if line_end == start:
+                # A blank line dispatches the event
+                if self._data:
+                    events.append(SSEEvent(self._event or "message", b"\n".join(self._data).decode("utf-8")))
+                self._event = ""
+                self._data = []
+            elif buffer[start] != 0x3A:  # ":" starts a comment, e.g. a keep-alive
+                self._field(buffer, start, line_end)
+            start = end + 1
+        if start:
+            del buffer[:start]
+        return events
+
+    def _field(self, buffer: bytearray, start: int, end: int) -> None:
+        colon = buffer.find(b":", start, end)
+        if colon == -1:
+            name, value = bytes(buffer[start:end]), b""
+        else:
+            name = bytes(buffer[start:colon])
+            value_start = colon + 2 if colon + 1 < end and buffer[colon + 1] == 0x20 else colon + 1
+            value = bytes(buffer[value_start:end])
+        if name == b"data":
+            self._data.append(value)
+        elif name == b"event":
+            self._event = value.decode("utf-8")
+        # `id` and `retry` are not used by the inference APIs
+
+    def flush(self) -> List[SSEEvent]:
+        """
+        Dispatches an event left pending when the stream ends without a trailing blank line.
+        """
+        events = self.feed(b"\n") if self._buffer else []
+        if self._data:
+            events.append(SSEEvent(self._event or "message", b"\n".join(self._data).decode("utf-8")))
+            self._event = ""
+            self._data = []
+        return events
@@ -9,7 +9,8 @@ import asyncio
 
 from cogniq.config import APP_URL
 from cogniq.slack import CogniqSlack
-from cogniq.openai import CogniqOpenAI
+from cogniq.openai import CogniqOpenAI, CompletionCache
+from cogniq.anthropic import CogniqAnthropic
 from cogniq.personalities import (
     BingSearch,
     ChatGPT4,
@@ -24,20 +25,25 @@ class MultiplePersonalities:
         # Initialize the slack bot
         self.cslack = CogniqSlack()
 
+        # The inference backends share one connection pool and one completion cache
+        completion_cache = CompletionCache(engine=self.cslack.engine)
+        self.inference_backend = CogniqOpenAI(completion_cache=completion_cache)
+        self.anthropic_backend = CogniqAnthropic(completion_cache=completion_cache)
+
         # Setup the personalities
-        self.bing_search = BingSearch(cslack=self.cslack, inference_backend=CogniqOpenAI())
-        self.chat_gpt4 = ChatGPT4(cslack=self.cslack, inference_backend=CogniqOpenAI())
+        self.bing_search = BingSearch(cslack=self.cslack, inference_backend=self.inference_backend)
+        self.chat_gpt4 = ChatGPT4(cslack=self.cslack, inference_backend=self.inference_backend)
         self.chat_anthropic = ChatAnthropic(
             cslack=self.cslack,
-            inference_backend=CogniqOpenAI(),
+            inference_backend=self.anthropic_backend,
         )
         self.slack_search = SlackSearch(
             cslack=self.cslack,
-            inference_backend=CogniqOpenAI(),
+            inference_backend=self.inference_backend,
         )
         self.evaluator = Evaluator(
             cslack=self.cslack,
-            inference_backend=CogniqOpenAI(),
+            inference_backend=self.inference_backend,
         )
 
         # Finally, register the app_mention and message events
@@ -53,7 +59,10 @@ class MultiplePersonalities:
         await self.chat_anthropic.async_setup()
         await self.slack_search.async_setup()
         await self.evaluator.async_setup()
-        await self.cslack.start()
+        try:
+            await self.cslack.start()
+        finally:
+            await self.inference_backend.async_close()
 
     async def first_response(self, *, context: Dict[str, Any], original_ts: str) -> Dict[str, str]:
         """
@@ -0,0 +1,52 @@
+"""
+Writes tiktoken encodings to TIKTOKEN_ENCODINGS_DIR, for cogniq.openai.encoding to load without network access.
+Run at image build time: `python prebake_encodings.py [encoding names]`.
+
+Deliberately imports nothing from cogniq, whose config requires the runtime secrets.
+"""
+from __future__ import annotations
+from typing import *
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import argparse
+import base64
+import json
+import os
+import tiktoken
+
+DEFAULT_ENCODINGS = ["cl100k_base"]  # every chat model CogniQ supports
+
+
+def prebake(name: str, directory: str) -> None:
+    encoding = tiktoken.get_encoding(name)
+    os.makedirs(directory, exist_ok=True)
+    ranks_path = os.path.join(directory, f"{name}.tiktoken")
+    spec_path = os.path.join(directory, f"{name}.json")
+
+    # Write to temporary files and rename, so a failed bake never leaves a partial encoding behind
+    with open(f"{ranks_path}.tmp", "wb") as f:
+        for token, rank in sorted(encoding._mergeable_ranks.items(), key=lambda item: item[1]):
+            f.write(base64.b64encode(token) + b" " + str(rank).encode() + b"\n")
+    with open(f"{spec_path}.tmp", "w") as f:
+        json.dump({"pat_str": encoding._pat_str, "special_tokens": encoding._special_tokens}, f)
+    os.replace(f"{ranks_path}.tmp", ranks_path)
+    os.replace(f"{spec_path}.tmp", spec_path)
+    logger.info("Wrote the %s encoding to %s", name, directory)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", default=DEFAULT_ENCODINGS, help="encodings to write")
+    parser.add_argument("--directory", default=os.getenv("TIKTOKEN_ENCODINGS_DIR", "tiktoken_encodings"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    for name in args.names:
+        prebake(name, args.directory)
+
+
+if __name__ == "__main__":
+    main()
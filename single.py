@@ -29,7 +29,10 @@ class Single:
         Starts one Slack bot instance, and multiple personalities.
         """
         await self.perplexity.async_setup()
-        await self.cslack.start()
+        try:
+            await self.cslack.start()
+        finally:
+            await self.perplexity.inference_backend.async_close()
 
     async def first_response(self, *, context: Dict[str, Any], original_ts: str) -> Dict[str, str]:
         """
@@ -52,7 +55,7 @@ class Single:
         # Text from the event
         text = event.get("text")
 
-        # TODO: setup stream callback
+        # ask_task streams the answer into the reply
         _dispatch_task = asyncio.create_task(
             self.perplexity.ask_task(
                 event=event,